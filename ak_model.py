@@ -379,7 +379,7 @@ def handle_message(json_data):
         "conversation": conversation_data["conversation"],
         "task": conversation_data["task"],
         "email": email
-    })
+    }, to=request.sid)
 
 @socketio.on("complete_session")
 def handle_complete_session(json_data):
@@ -396,7 +396,7 @@ def handle_complete_session(json_data):
         {"$set": {"journal_report": report}},
         upsert=True
     )
-    socketio.emit("session_complete", {"report": report})
+    socketio.emit("session_complete", {"report": report}, to=request.sid)
 
 @socketio.on("complete_task")
 def handle_complete_task(json_data):
@@ -418,7 +418,7 @@ def handle_complete_task(json_data):
         {"$set": {"task_feedback": feedback}},
         upsert=True
     )
-    socketio.emit("task_feedback", {"feedback": feedback, "email": email})
+    socketio.emit("task_feedback", {"feedback": feedback, "email": email}, to=request.sid)
 
 if __name__ == "__main__":
     socketio.run(app, host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,487 @@
+"""asyncio entry point for the chat backend, with the same API as server.py.
+
+Runs python-socketio's AsyncServer on aiohttp, talks to Mongo through pymongo's
+native async client and drives the graph with `assistant.astream`, so a turn
+that is waiting on Groq no longer holds a thread. Tokens are ordinary
+flask_jwt_extended-compatible JWTs, so clients can switch servers freely.
+
+    python async_server.py
+"""
+import asyncio
+import datetime
+import os
+import time
+import uuid
+
+import jwt
+import socketio
+from aiohttp import web
+from bson import ObjectId
+from dotenv import load_dotenv, find_dotenv
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from pymongo.errors import DuplicateKeyError
+
+from conversation_store import aappend_messages, aget_page, ahas_messages, page_args
+from db import get_async_db
+from indexes import ensure_indexes
+from llm_clients import llm_status
+import passwords
+import metrics
+from model import assistant, atask_assignment_agent
+from scheduler import AsyncTurnScheduler, feedback_workers
+import feedback_jobs
+from utils import warm_up, model_status
+
+load_dotenv(find_dotenv())
+
+async_db = get_async_db()
+users_collection = async_db["users"]
+conversations_collection = async_db["conversations"]
+tasks_collection = async_db["tasks"]
+
+jwt_secret = os.getenv("JWT_SECRET")
+
+sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+# Each user's messages are processed in order, different users in parallel
+turns = AsyncTurnScheduler()
+metrics.Gauge("chat_turns_queued", "Chat turns waiting for a worker.", function=lambda: turns.queued)
+metrics.Gauge("chat_turns_running", "Chat turns being processed.", function=lambda: turns.running)
+# Feedback jobs run after the response has been sent, each user's in order
+feedback_queue = AsyncTurnScheduler(max_workers=feedback_workers)
+metrics.Gauge("feedback_jobs_queued", "Feedback jobs waiting for a worker.", function=lambda: feedback_queue.queued)
+metrics.Gauge("feedback_jobs_running", "Feedback jobs being processed.", function=lambda: feedback_queue.running)
+# Jobs started after a reply (task generation), kept alive until they finish
+background_tasks = set()
+
+# Fork the password workers before any model-loading threads start
+passwords.start_pool()
+# Load the BERT models in the background so the server binds its port right away
+warm_up()
+# Create any missing indexes for the hot queries (no-op when they already exist)
+ensure_indexes()
+
+
+def create_access_token(email):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {
+        "fresh": False,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "type": "access",
+        "sub": email,
+        "nbf": now,
+        "exp": now + datetime.timedelta(days=1),
+    }
+    return jwt.encode(payload, jwt_secret, algorithm="HS256")
+
+
+def decode_token(token):
+    return jwt.decode(token, jwt_secret, algorithms=["HS256"])
+
+
+def jwt_required(handler):
+    """Rejects the request unless it carries a valid bearer token; sets request["email"]."""
+    async def wrapper(request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            return web.json_response({"msg": "Missing Authorization Header"}, status=401)
+        try:
+            request["email"] = decode_token(header[len("Bearer "):])["sub"]
+        except jwt.InvalidTokenError as e:
+            return web.json_response({"msg": str(e)}, status=401)
+        return await handler(request)
+    return wrapper
+
+
+@web.middleware
+async def cors(request, handler):
+    # The Socket.IO endpoint sets its own CORS headers
+    if request.path.startswith("/socket.io"):
+        return await handler(request)
+    if request.method == "OPTIONS":
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Headers"] = "Authorization, Content-Type"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, OPTIONS"
+    return response
+
+
+routes = web.RouteTableDef()
+
+
+@routes.post("/api/signup")
+async def signup(request):
+    data = await request.json()
+    full_name = data.get("name")
+    email = data.get("email")
+    password = data.get("password")
+
+    if not full_name or not email or not password:
+        return web.json_response({"error": "Missing required fields"}, status=400)
+    if await users_collection.find_one({"email": email}):
+        return web.json_response({"error": "User already exists"}, status=400)
+
+    try:
+        hashed_password = await passwords.ahash_password(password)
+    except passwords.PasswordQueueFull:
+        return web.json_response({"error": "Server busy, please try again"}, status=503)
+    try:
+        await users_collection.insert_one({
+            "fullName": full_name,
+            "email": email,
+            "password": hashed_password,
+            "phoneNumber": data.get("phoneNumber"),
+            "age": data.get("age"),
+            "gender": data.get("gender"),
+            "created_at": datetime.datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # A concurrent signup with the same email won the unique index
+        return web.json_response({"error": "User already exists"}, status=400)
+
+    return web.json_response({"message": "User created successfully"}, status=201)
+
+
+@routes.post("/api/login")
+async def login(request):
+    data = await request.json()
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return web.json_response({"error": "Missing email or password"}, status=400)
+
+    user = await users_collection.find_one({"email": email})
+    try:
+        valid = user is not None and await passwords.acheck_password(user["password"], password)
+    except passwords.PasswordQueueFull:
+        return web.json_response({"error": "Server busy, please try again"}, status=503)
+    if valid:
+        return web.json_response({
+            "message": "Login successful",
+            "token": create_access_token(email),
+            "email": email,
+            "userName": user["fullName"],
+            "userId": str(user["_id"])
+        })
+    return web.json_response({"error": "Invalid credentials"}, status=401)
+
+
+@routes.get("/api/protected")
+@jwt_required
+async def protected(request):
+    user = await users_collection.find_one({"email": request["email"]})
+    user_data = {
+        "user_id": str(user["_id"]),
+        "fullName": user["fullName"],
+        "email": user["email"],
+        "phoneNumber": user["phoneNumber"],
+        "age": user["age"],
+        "gender": user["gender"],
+        "disorder": user.get("disorder", None),
+    }
+    return web.json_response({"user": user_data})
+
+
+@routes.get("/")
+async def index(request):
+    return web.Response(text="Backend is running.")
+
+
+@routes.get("/api/ready")
+async def ready(request):
+    models = model_status()
+    is_ready = all(m["state"] == "ready" for m in models.values())
+    return web.json_response({"ready": is_ready, "models": models}, status=200 if is_ready else 503)
+
+
+@routes.get("/api/queue")
+async def queue_status(request):
+    return web.json_response({"turns": turns.stats(), "feedback": feedback_queue.stats(), "llm": llm_status(), "passwords": passwords.status()})
+
+
+@routes.get("/metrics")
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+@routes.get("/api/conversations")
+@jwt_required
+async def get_conversations(request):
+    user = await users_collection.find_one({"email": request["email"]})
+    user_id = str(user["_id"])
+
+    try:
+        before, limit = page_args(request.query.get("before"), request.query.get("limit", 50))
+    except ValueError:
+        return web.json_response({"error": "Invalid before or limit"}, status=400)
+
+    await conversations_collection.update_one(
+        {"user_id": user_id},
+        {"$setOnInsert": {"user_id": user_id, "distortion": []}},
+        upsert=True
+    )
+
+    if not await ahas_messages(user_id):
+        await aappend_messages(user_id, [
+            {
+                "sender": "ai",
+                "content": "Hello! How can I help you today?",
+                "timestamp": datetime.datetime.now().isoformat(),
+                "type": "text",
+            }
+        ])
+
+    conversation, before = await aget_page(user_id, before, limit)
+
+    return web.json_response({"conversation": conversation, "before": before, "has_more": before is not None})
+
+
+@routes.get("/api/tasks")
+@jwt_required
+async def get_tasks(request):
+    user = await users_collection.find_one({"email": request["email"]})
+    user_id = str(user["_id"])
+
+    tasks_doc = []
+    async for task in tasks_collection.find({"user_id": user_id}):
+        task["_id"] = str(task["_id"])
+        tasks_doc.append(task)
+
+    return web.json_response({"tasks": tasks_doc})
+
+
+@routes.get("/api/singleTask")
+@jwt_required
+async def get_single_task(request):
+    user = await users_collection.find_one({"email": request["email"]})
+    user_id = str(user["_id"])
+
+    task_doc = await tasks_collection.find_one({"user_id": user_id, "completed": False})
+    if not task_doc:
+        return web.json_response({"error": "No tasks found"}, status=404)
+
+    task_doc["_id"] = str(task_doc["_id"])
+    return web.json_response({"task": task_doc})
+
+
+@routes.put("/api/user")
+@jwt_required
+async def update_user(request):
+    data = await request.json()
+    await users_collection.update_one(
+        {"email": request["email"]},
+        {"$set": {"disorder": data.get("disorder")}},
+    )
+    return web.json_response({"message": "User updated successfully"})
+
+
+@routes.post("/api/feedback/{taskId}")
+@jwt_required
+async def submit_feedback(request):
+    task_id = ObjectId(request.match_info["taskId"])
+    data = await request.json()
+    feedback = data["feedback"]
+
+    task_doc = await tasks_collection.find_one({"_id": task_id})
+    if not task_doc:
+        return web.json_response({"error": "Task not found"}, status=404)
+
+    # Rating and summarizing take seconds; answer now and push the result when it is ready
+    job, created = await feedback_jobs.asubmit(task_doc, feedback)
+    if created and not feedback_queue.submit(task_doc["user_id"], process_feedback, task_doc, feedback, job["id"]):
+        await feedback_jobs.afail(task_id, job["id"], "server busy")
+        return web.json_response({"error": "Too many feedback submissions in progress, please try again shortly"}, status=503)
+    if not created:
+        # This feedback was not recorded; the client can resubmit once the running job finishes
+        return web.json_response({
+            "error": "Feedback for this task is already being processed",
+            "jobId": job["id"],
+            "status": job["status"],
+            "statusUrl": f"/api/feedback/jobs/{job['id']}",
+        }, status=409)
+
+    return web.json_response({
+        "message": "Feedback received",
+        "jobId": job["id"],
+        "status": job["status"],
+        "statusUrl": f"/api/feedback/jobs/{job['id']}",
+    }, status=202)
+
+
+async def process_feedback(task_doc, feedback, job_id):
+    result = await feedback_jobs.arun(task_doc, feedback, job_id)
+    if result is not None:
+        await sio.emit("feedback_processed", result, to=task_doc["user_id"])
+
+
+@routes.get("/api/feedback/jobs/{jobId}")
+@jwt_required
+async def get_feedback_job(request):
+    user = await users_collection.find_one({"email": request["email"]})
+    job = await feedback_jobs.aget(request.match_info["jobId"], str(user["_id"]))
+    if job is None:
+        return web.json_response({"error": "Job not found"}, status=404)
+    return web.json_response(job)
+
+
+@sio.event
+async def connect(sid, environ, auth):
+    """Only accept sockets that present a valid JWT, and put each one in its user's room."""
+    token = (auth or {}).get("token")
+    if not token:
+        return False
+    try:
+        email = decode_token(token)["sub"]
+    except jwt.InvalidTokenError:
+        return False
+    user = await users_collection.find_one({"email": email}, {"_id": 1})
+    if not user:
+        return False
+
+    user_id = str(user["_id"])
+    await sio.save_session(sid, {"user_id": user_id})
+    await sio.enter_room(sid, user_id)
+
+
+async def stream_reply(initial_data, config, user_id, on_reply):
+    """Run the graph, forwarding chat_node tokens as receive_message_chunk events.
+
+    Awaits on_reply(state) with the state as of chat_node's update, before the summary runs.
+    """
+    start = time.perf_counter()
+    first_token = None
+    response = None
+    replied = False
+    async for mode, chunk in assistant.astream(initial_data, config, stream_mode=["messages", "updates", "values"]):
+        if mode == "updates":
+            replied = replied or "chat_node" in chunk
+            continue
+        if mode == "values":
+            response = chunk
+            if replied:
+                await on_reply(chunk)
+                replied = False
+            continue
+        message, metadata = chunk
+        if metadata.get("langgraph_node") != "chat_node" or not isinstance(message, AIMessageChunk) or not message.content:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+            metrics.first_token_seconds.observe(first_token)
+        await sio.emit("receive_message_chunk", {"content": message.content, "sender": "ai"}, to=user_id)
+
+    total = time.perf_counter() - start
+    if first_token is not None:
+        print(f"time to first token: {first_token * 1000:.0f}ms, full turn: {total * 1000:.0f}ms")
+    return response
+
+
+@sio.on("send_message")
+async def handle_message(sid, json_data):
+    user_id = (await sio.get_session(sid)).get("user_id")
+    if not user_id:
+        return
+    if not turns.submit(user_id, process_message, user_id, json_data):
+        await sio.emit("server_busy", {"error": "Too many messages in progress, please try again shortly"}, to=sid)
+
+
+async def process_message(user_id, json_data):
+    user_message = json_data["userMessage"]
+
+    initial_data = {
+        "messages": [HumanMessage(content=user_message["content"])],
+        "user_input": user_message["content"],
+        "distortion": [],
+        "task": ""
+    }
+
+    # Both lookups are independent, so they share one round trip's worth of waiting
+    state_doc, tasks = await asyncio.gather(
+        conversations_collection.find_one({"user_id": user_id}),
+        tasks_collection.find_one({"user_id": user_id, "completed": False}),
+    )
+    if (state_doc or {}).get("distortion", []):
+        initial_data["distortion"] = state_doc["distortion"]
+    if tasks:
+        initial_data["task"] = tasks["description"]
+
+    config = {"configurable": {"thread_id": user_id}}
+    await stream_reply(initial_data, config, user_id, lambda state: deliver_reply(user_id, user_message, state))
+
+
+async def deliver_reply(user_id, user_message, response):
+    """Save the turn and send the reply from the state chat_node produced."""
+    ai_responses = [msg.content for msg in response["messages"] if isinstance(msg, AIMessage)]
+    ai_response = ai_responses[-1]
+    ai_timestamp = datetime.datetime.now().isoformat()
+
+    user_entry = {
+        "sender": "user",
+        "content": user_message["content"],
+        "timestamp": user_message["timestamp"],
+        "type": user_message["type"]
+    }
+    if user_message["type"] == "audio":
+        user_entry["uri"] = user_message.get("uri", "")
+
+    await asyncio.gather(
+        aappend_messages(user_id, [
+            user_entry,
+            {"sender": "ai", "content": ai_response, "timestamp": ai_timestamp, "type": "text"}
+        ]),
+        conversations_collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"distortion": response["distortion"]}},
+            upsert=True
+        ),
+    )
+
+    await sio.emit("receive_message", {
+        "content": ai_response,
+        "sender": "ai",
+        "timestamp": ai_timestamp,
+        "task": ""  # new tasks arrive separately as task_assigned
+    }, to=user_id)
+
+    # The task prompt is large, so it runs after the reply instead of delaying it
+    task = sio.start_background_task(assign_task, user_id, response)
+    # The event loop only keeps weak references to tasks
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def assign_task(user_id, state):
+    """Generate a CBT task from the turn's state and push it as task_assigned."""
+    try:
+        task = (await atask_assignment_agent(state))["task"]
+    except Exception as e:
+        print(f"task generation failed for {user_id}: {e}")
+        return
+    if not task:
+        return
+
+    # Only insert if the user still has no open task (another turn's job may have added one)
+    result = await tasks_collection.update_one(
+        {"user_id": user_id, "completed": False},
+        {"$setOnInsert": {"user_id": user_id, "description": task, "completed": False}},
+        upsert=True
+    )
+    if result.upserted_id is None:
+        return
+    await sio.emit("task_assigned", {
+        "task": {"_id": str(result.upserted_id), "description": task, "completed": False}
+    }, to=user_id)
+
+
+def create_app():
+    app = web.Application(middlewares=[cors])
+    app.add_routes(routes)
+    sio.attach(app)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
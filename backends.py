@@ -0,0 +1,109 @@
+import os
+import re
+
+import torch
+
+# Exported / quantized ONNX graphs are cached here so the export only runs once per model
+onnx_cache_dir = os.getenv("ONNX_CACHE_DIR", "onnx_models")
+
+
+class TorchBackend:
+    """Runs the PyTorch model directly. This is the default backend."""
+
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, inputs):
+        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            # float() so bf16/fp16 models (MODEL_DTYPE) hand back the same fp32 logits as before
+            return self.model(**inputs).logits.float().cpu()
+
+
+class _LogitsOnly(torch.nn.Module):
+    # The exporter needs a plain tensor output rather than a ModelOutput
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids).logits
+
+
+class OnnxBackend:
+    """Serves the model through ONNX Runtime, optionally with int8 dynamic quantization."""
+
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+
+    def __init__(self, model, tokenizer, model_name, quantize=False, cache_dir=onnx_cache_dir, revision=None):
+        try:
+            import onnxruntime
+        except ImportError as exc:
+            raise ImportError("INFERENCE_BACKEND=onnx requires the onnx and onnxruntime packages (pip install -r requirements-onnx.txt)") from exc
+
+        self.name = "onnx-int8" if quantize else "onnx"
+        os.makedirs(cache_dir, exist_ok=True)
+        # `revision` (model_loader.weights_revision) is part of the name, so changed weights
+        # are exported again instead of serving a stale graph
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{model_name}@{revision}").strip("_")
+        fp32_path = os.path.join(cache_dir, f"{slug}.onnx")
+        if not os.path.exists(fp32_path):
+            export_onnx(model, tokenizer, fp32_path)
+        path = fp32_path
+        if quantize:
+            path = os.path.join(cache_dir, f"{slug}.int8.onnx")
+            if not os.path.exists(path):
+                quantize_onnx(fp32_path, path)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if os.getenv("ORT_NUM_THREADS"):
+            options.intra_op_num_threads = int(os.getenv("ORT_NUM_THREADS"))
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.path = path
+
+    def __call__(self, inputs):
+        feed = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        return torch.from_numpy(self.session.run(["logits"], feed)[0])
+
+
+def export_onnx(model, tokenizer, path):
+    """Export a sequence classifier to ONNX with dynamic batch and sequence axes."""
+    print(f"exporting {path}")
+    sample = tokenizer(["export sample", "a slightly longer export sample"], return_tensors="pt", padding=True)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in OnnxBackend.input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    model = model.to("cpu").eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            tuple(sample[name] for name in OnnxBackend.input_names),
+            path,
+            input_names=OnnxBackend.input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+
+
+def quantize_onnx(fp32_path, int8_path):
+    """Int8 dynamic quantization of the weights; activations stay fp32."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"quantizing {int8_path}")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+
+def load_backend(model, tokenizer, model_name, kind=None, revision=None):
+    """Build the backend selected by INFERENCE_BACKEND: torch (default), onnx or onnx-int8."""
+    kind = (kind or os.getenv("INFERENCE_BACKEND", "torch")).lower()
+    if kind == "torch":
+        return TorchBackend(model)
+    if kind == "onnx":
+        return OnnxBackend(model, tokenizer, model_name, revision=revision)
+    if kind == "onnx-int8":
+        return OnnxBackend(model, tokenizer, model_name, quantize=True, revision=revision)
+    raise ValueError(f"Unknown INFERENCE_BACKEND: {kind}")
@@ -0,0 +1,126 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+import metrics
+
+
+class InferenceBatcher:
+    """Collects classification requests from concurrent callers and runs them as one padded forward pass.
+
+    Callers block on `predict` while a single worker thread waits up to `max_wait_ms`
+    (or until `max_batch_size` requests are queued), tokenizes the batch with padding,
+    runs the backend once and hands every caller its own row of logits. `backend` is
+    any callable taking the tokenized batch and returning logits (see backends.py).
+    Identical texts submitted while one is still pending share a single Future, so
+    e.g. the classifier gate and speculative detection only run BERT once per message.
+    With a `cache` (prediction_cache.PredictionCache), texts predicted before skip the queue.
+    """
+
+    def __init__(self, backend, tokenizer, max_batch_size=16, max_wait_ms=5.0, max_length=512, name="model", cache=None):
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_length = max_length
+        self.name = name
+        self.cache = cache
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        # text -> Future for every request that is queued or in the batch being run
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self.deduplicated = 0
+
+    def submit(self, text):
+        """Queue `text` for the next batch and return a Future resolving to its logits."""
+        if self.cache is not None:
+            logits = self.cache.get(self.cache.key(text))
+            if logits is not None:
+                future = Future()
+                future.set_result(logits)
+                return future
+        with self._pending_lock:
+            future = self._pending.get(text)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            future = self._pending[text] = Future()
+            metrics.bert_pending.set(len(self._pending), model=self.name)
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def predict(self, text):
+        """Return the 1-D logits tensor for `text`."""
+        return self.submit(text).result()
+
+    def predict_label(self, text):
+        """Return the argmax class index for `text`."""
+        return torch.argmax(self.predict(text), dim=-1).item()
+
+    async def apredict(self, text):
+        """Like `predict`, but awaits the batch without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    async def apredict_label(self, text):
+        return torch.argmax(await self.apredict(text), dim=-1).item()
+
+    def tokenize(self, texts):
+        """Tokenize a whole batch in one call, padded to its longest text. Fast tokenizers
+        encode the texts of one call in parallel in Rust."""
+        with metrics.bert_tokenize_seconds.time(model=self.name):
+            return self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=self.max_length)
+
+    def _ensure_worker(self):
+        # Started on first use so that importing the module never spawns threads
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self._process(self._collect())
+
+    def _process(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            inputs = self.tokenize(texts)
+            with metrics.bert_seconds.time(model=self.name):
+                logits = self.backend(inputs)
+            metrics.bert_batch_size.observe(len(texts), model=self.name)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+        else:
+            for (text, future), row in zip(batch, logits):
+                if self.cache is not None:
+                    self.cache.put(self.cache.key(text), row)
+                future.set_result(row)
+
+        with self._pending_lock:
+            for text in texts:
+                self._pending.pop(text, None)
+            metrics.bert_pending.set(len(self._pending), model=self.name)
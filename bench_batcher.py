@@ -0,0 +1,81 @@
+"""Throughput of the distortion model against the batch window size.
+
+Simulates many users sending messages at once: each worker thread pushes
+requests through an InferenceBatcher in front of `bert_model`
+(using whichever INFERENCE_BACKEND is configured) and we report
+requests/second and per-request latency for every window size.
+
+    python bench_batcher.py --concurrency 32 --requests 20 --windows 0 2 5 10 20
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from batcher import InferenceBatcher
+from utils import bert
+
+messages = [
+    "ok",
+    "thanks",
+    "I don't know",
+    "I failed my exam, so I will never be good at anything.",
+    "Everyone at work thinks I'm useless and they're probably right.",
+    "If I don't get this job my whole life is ruined.",
+    "I had a nice walk today and felt a bit calmer afterwards.",
+    "My friend didn't reply to my message, she must be angry with me. I keep going over what I said and "
+    "I can't stop thinking that I ruined the friendship for good.",
+]
+
+
+def run(window_ms, max_batch_size, concurrency, requests_per_worker):
+    batcher = InferenceBatcher(bert.backend, bert.tokenizer, max_batch_size=max_batch_size, max_wait_ms=window_ms, name="bench")
+    batcher.predict_label(messages[0])  # warm-up, starts the worker thread
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        local = []
+        for i in range(requests_per_worker):
+            start = time.perf_counter()
+            # Unique texts, so the batcher's de-duplication of pending requests doesn't skip work
+            batcher.predict_label(f"{messages[(offset + i) % len(messages)]} ({offset}.{i})")
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def unbatched(concurrency, requests_per_worker):
+    # Baseline: the original one-forward-pass-per-message path, max batch size 1
+    return run(0, 1, concurrency, requests_per_worker)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="requests per concurrent user")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5, 10, 20], help="batch windows in ms")
+    args = parser.parse_args()
+
+    print(f"{'window ms':>10} {'batch':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    result = unbatched(args.concurrency, args.requests)
+    print(f"{'baseline':>10} {1:>6} {result['throughput']:>9.1f} {result['p50']:>9.1f} {result['p95']:>9.1f}")
+    for window in args.windows:
+        result = run(window, args.max_batch_size, args.concurrency, args.requests)
+        print(f"{window:>10g} {args.max_batch_size:>6} {result['throughput']:>9.1f} {result['p50']:>9.1f} {result['p95']:>9.1f}")
@@ -0,0 +1,104 @@
+"""Per-turn checkpoint latency and process RSS: MemorySaver vs MongoSaver.
+
+Drives a small chat-shaped graph (one node that appends a reply) through
+--threads conversations of --turns turns each, so only checkpointing differs
+between the runs. Each saver runs in its own subprocess so RSS is comparable.
+MongoSaver writes to a throwaway `checkpoint_bench` database on MONGO_URI.
+
+    python bench_checkpointer.py --threads 10000 --turns 3
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END, MessagesState
+
+
+class BenchState(MessagesState):
+    user_input: str
+    distortion: list[str]
+    summary: str
+
+
+def reply(state: BenchState):
+    # Roughly the size of a real MindMend reply
+    return {"messages": [AIMessage(content="That sounds really hard. " * 12)], "distortion": state["distortion"] + ["No Distortion"]}
+
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(saver_name, threads, turns):
+    if saver_name == "mongo":
+        from pymongo import MongoClient
+        from mongo_checkpointer import MongoSaver
+
+        client = MongoClient(os.getenv("MONGO_URI"))
+        client.drop_database("checkpoint_bench")
+        bench_db = client["checkpoint_bench"]
+        saver = MongoSaver(bench_db["checkpoints"], bench_db["checkpoint_writes"])
+    else:
+        saver = MemorySaver()
+
+    workflow = StateGraph(state_schema=BenchState)
+    workflow.add_node("reply", reply)
+    workflow.add_edge(START, "reply")
+    workflow.add_edge("reply", END)
+    graph = workflow.compile(checkpointer=saver)
+
+    start_rss = rss_mb()
+    latencies = []
+    for turn in range(turns):
+        for thread in range(threads):
+            config = {"configurable": {"thread_id": f"user-{thread}"}}
+            text = f"Turn {turn}: I keep thinking everyone at work is judging me."
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=text)], "user_input": text, "distortion": []}, config)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    result = {
+        "saver": saver_name,
+        "turns": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "rss_growth_mb": rss_mb() - start_rss,
+        "rss_mb": rss_mb(),
+    }
+    if saver_name == "mongo":
+        client.drop_database("checkpoint_bench")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--saver", choices=["memory", "mongo"], help="run a single saver in this process")
+    args = parser.parse_args()
+
+    if args.saver:
+        print(json.dumps(run(args.saver, args.threads, args.turns)))
+        sys.exit(0)
+
+    print(f"{args.threads} threads x {args.turns} turns")
+    print(f"{'saver':>8} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8} {'growth MB':>10}")
+    for saver_name in ("memory", "mongo"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--saver", saver_name, "--threads", str(args.threads), "--turns", str(args.turns)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{saver_name:>8} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['rss_mb']:>8.0f} {result['rss_growth_mb']:>10.0f}")
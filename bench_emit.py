@@ -0,0 +1,54 @@
+"""Cost of one server emit with many idle sockets connected: global broadcast vs the user's room.
+
+Connects N Flask-SocketIO test clients (each in its own room, as server.py does
+on connect) and times emitting a chat chunk to everyone, the way the server used
+to, against emitting it to a single room. The test clients queue packets in
+memory, so this measures the server-side fan-out work, not network writes.
+
+    python bench_emit.py --clients 1000 --emits 200
+"""
+import argparse
+import statistics
+import time
+
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+
+app = Flask(__name__)
+socketio = SocketIO(app)
+
+
+@socketio.on("connect")
+def handle_connect(auth):
+    join_room(auth["user_id"])
+
+
+def time_emits(emits, **target):
+    latencies = []
+    for _ in range(emits):
+        start = time.perf_counter()
+        socketio.emit("receive_message_chunk", {"content": "hello", "sender": "ai"}, **target)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--emits", type=int, default=200)
+    args = parser.parse_args()
+
+    clients = [socketio.test_client(app, auth={"user_id": f"user-{i}"}) for i in range(args.clients)]
+
+    print(f"{args.clients} idle clients, {args.emits} emits")
+    print(f"{'target':>10} {'mean us':>9} {'p95 us':>9} {'deliveries':>11}")
+    for name, target in (("broadcast", {}), ("room", {"to": "user-0"})):
+        for client in clients:
+            client.get_received()
+        latencies = time_emits(args.emits, **target)
+        latencies.sort()
+        deliveries = sum(len(client.get_received()) for client in clients)
+        print(
+            f"{name:>10} {statistics.mean(latencies) * 1e6:>9.1f} {latencies[int(len(latencies) * 0.95) - 1] * 1e6:>9.1f} "
+            f"{deliveries:>11}"
+        )
@@ -0,0 +1,62 @@
+"""How many LLM classifier calls the local BERT gate avoids, and the latency it saves.
+
+Runs classifier_node over a reference set in CLASSIFIER_MODE=llm and =gate and
+reports the fraction of LLM calls avoided, mean classification latency, and how
+often the gate's local decisions agree with the LLM's. Pass --stub-latency-ms to
+use the local Groq stub instead of the real API (agreement is then meaningless,
+as the stub always answers 'chat').
+
+    python bench_gate.py --chat-threshold 0.9 --distortion-threshold 0.9
+"""
+import argparse
+import os
+import statistics
+import time
+
+from compare_backends import distortion_reference
+from stub_groq import StubGroqServer
+
+
+def classify_all(model, mode, messages):
+    model.classifier_mode = mode
+    decisions, latencies = [], []
+    for text in messages:
+        start = time.perf_counter()
+        result = model.classifier_node({"user_input": text, "distortion": []})
+        latencies.append(time.perf_counter() - start)
+        decisions.append("distortion" if result["needs_distortion_check"] else "chat")
+    return decisions, latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat-threshold", type=float, help="overrides GATE_CHAT_THRESHOLD")
+    parser.add_argument("--distortion-threshold", type=float, help="overrides GATE_DISTORTION_THRESHOLD")
+    parser.add_argument("--stub-latency-ms", type=float, help="serve the LLM from a local stub with this latency")
+    args = parser.parse_args()
+
+    if args.stub_latency_ms is not None:
+        stub = StubGroqServer(latency_ms=args.stub_latency_ms).start()
+        os.environ["GROQ_API_BASE"] = stub.url
+
+    import model
+
+    if args.chat_threshold is not None:
+        model.gate_chat_threshold = args.chat_threshold
+    if args.distortion_threshold is not None:
+        model.gate_distortion_threshold = args.distortion_threshold
+
+    model.bert.wait()
+    llm_decisions, llm_latencies = classify_all(model, "llm", distortion_reference)
+    for key in model.gate_stats:
+        model.gate_stats[key] = 0
+    gate_decisions, gate_latencies = classify_all(model, "gate", distortion_reference)
+    report = model.gate_report()
+
+    agreement = sum(a == b for a, b in zip(gate_decisions, llm_decisions)) / len(distortion_reference)
+    print(f"{len(distortion_reference)} messages, chat threshold {model.gate_chat_threshold}, distortion threshold {model.gate_distortion_threshold}")
+    print(f"LLM calls avoided:        {report['llm_calls_avoided']:.0%} ({report['bert_chat']} chat, {report['bert_distortion']} distortion decided locally)")
+    print(f"mean latency, llm mode:   {statistics.mean(llm_latencies) * 1000:.1f}ms")
+    print(f"mean latency, gate mode:  {statistics.mean(gate_latencies) * 1000:.1f}ms")
+    print(f"latency saved per turn:   {(statistics.mean(llm_latencies) - statistics.mean(gate_latencies)) * 1000:.1f}ms")
+    print(f"agreement with LLM:       {agreement:.0%}")
@@ -0,0 +1,85 @@
+"""Per-turn wall-clock latency of the assistant graph: GRAPH_MODE=serial vs parallel.
+
+Runs --conversations conversations of --turns turns each through
+`assistant.stream` against the local Groq stub, with in-memory checkpoints so
+only the graph shape differs. Reports time to the first reply token, time until
+chat_node has finished the reply (when the servers save it and send
+receive_message), and time until the whole turn, summary included, is done.
+Each mode runs in its own subprocess because the graph is built at import time.
+
+    python bench_graph.py --latency-ms 300 --classifier-mode llm
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from compare_backends import distortion_reference
+from stub_groq import StubGroqServer
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(int(len(values) * q) - 1, 0)]
+
+
+def run(conversations, turns):
+    from langchain_core.messages import HumanMessage
+    import model
+
+    model.bert.wait()
+    first_token, reply, total = [], [], []
+    for conversation in range(conversations):
+        config = {"configurable": {"thread_id": f"bench-{conversation}"}}
+        for turn in range(turns):
+            text = distortion_reference[(conversation * turns + turn) % len(distortion_reference)]
+            data = {"messages": [HumanMessage(content=text)], "user_input": text, "distortion": [], "task": ""}
+            start = time.perf_counter()
+            first = done = None
+            for mode, chunk in model.assistant.stream(data, config, stream_mode=["messages", "updates"]):
+                if mode == "messages" and first is None and chunk[1].get("langgraph_node") == "chat_node":
+                    first = time.perf_counter() - start
+                elif mode == "updates" and "chat_node" in chunk:
+                    done = time.perf_counter() - start
+            total.append(time.perf_counter() - start)
+            first_token.append(first)
+            reply.append(done)
+
+    return {
+        name: {"mean": statistics.mean(values) * 1000, "p50": statistics.median(values) * 1000, "p95": percentile(values, 0.95) * 1000}
+        for name, values in (("first token", first_token), ("reply done", reply), ("turn done", total))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=10, help="enough turns to trigger summaries")
+    parser.add_argument("--latency-ms", type=float, default=300, help="stub Groq latency per call")
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--classifier-mode", default="llm", choices=["llm", "gate"])
+    parser.add_argument("--stub-classifier", default="distortion", choices=["chat", "distortion"], help="what the stub LLM classifier answers")
+    parser.add_argument("--graph-mode", choices=["serial", "parallel"], help="run a single mode in this process")
+    args = parser.parse_args()
+
+    if args.graph_mode:
+        print(json.dumps(run(args.conversations, args.turns)))
+        sys.exit(0)
+
+    stub = StubGroqServer(latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms, classifier_reply=args.stub_classifier).start()
+    env = dict(os.environ, GROQ_API_BASE=stub.url, CHECKPOINTER="memory", CLASSIFIER_MODE=args.classifier_mode)
+    print(f"{args.conversations} conversations x {args.turns} turns, stub latency {args.latency_ms:g}ms, "
+          f"CLASSIFIER_MODE={args.classifier_mode}, stub classifier says {args.stub_classifier}")
+    print(f"{'GRAPH_MODE':>10} {'':>12} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in ("serial", "parallel"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--graph-mode", mode, "--conversations", str(args.conversations), "--turns", str(args.turns)],
+            env=dict(env, GRAPH_MODE=mode), capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for name, stats in result.items():
+            print(f"{mode:>10} {name:>12} {stats['mean']:>8.0f} {stats['p50']:>8.0f} {stats['p95']:>8.0f}")
+    stub.shutdown()
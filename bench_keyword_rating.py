@@ -0,0 +1,101 @@
+"""How much journal feedback the keyword fast path rates without the sentiment model, and how often it agrees.
+
+Runs keyword_rating.classify and the sentiment model (from .env, like utils.py)
+on every feedback text: the reference_texts.py set, the samples below, and, with
+--texts, a file of real feedback with one text per line. It reports:
+- the fraction short-circuited, broken down by reason;
+- the fast path's agreement with the model on the texts it rated;
+- the texts where the two disagree;
+- the time per text of each.
+
+Exits with status 1 if agreement is below --min-agreement.
+
+    python bench_keyword_rating.py --texts feedback.txt --min-agreement 0.9
+"""
+import argparse
+import collections
+import sys
+import time
+
+import keyword_rating
+from reference_texts import sentiment_reference
+from utils import senti_mapping, sentiment
+
+FEEDBACK_SAMPLES = [
+    "okay",
+    "It was fine.",
+    "Fine I guess",
+    "I feel confident now.",
+    "Great!",
+    "I'm proud I did it and happy with the result.",
+    "Excellent, it really helped.",
+    "Not bad at all.",
+    "Average.",
+    "I felt nervous the whole time.",
+    "Still anxious about it.",
+    "I'm unsure whether I did it right.",
+    "I wasn't confident doing it.",
+    "Not happy with how it went.",
+    "It was okay but I felt anxious.",
+    "I was nervous at first, but proud afterwards.",
+    "I skipped it this week.",
+    "Writing the thoughts down helped me see them differently.",
+    "I did it twice and noticed I was catastrophizing less each time, which surprised me.",
+    "Never felt so accomplished.",
+]
+
+
+def model_rating(text):
+    # The backend directly, so the prediction cache doesn't answer repeats
+    logits = sentiment.backend(sentiment.batcher.tokenize([text]))
+    return int(logits.argmax(dim=-1)[0])
+
+
+def time_per_text(fn, texts, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeats * len(texts))
+
+
+def main(args):
+    texts = sentiment_reference + FEEDBACK_SAMPLES
+    if args.texts:
+        with open(args.texts) as f:
+            texts += [line.strip() for line in f if line.strip()]
+    names = {rating: name for name, rating in senti_mapping.items()}
+
+    reasons = collections.Counter()
+    rated, disagreements = 0, []
+    for text in texts:
+        reason, rating = keyword_rating.classify(text)
+        reasons[reason] += 1
+        if rating is None:
+            continue
+        rated += 1
+        model = model_rating(text)
+        if model != rating:
+            disagreements.append((text, rating, model))
+
+    agreement = (rated - len(disagreements)) / rated if rated else 1.0
+    print(f"{len(texts)} feedback texts, {rated} ({rated / len(texts):.0%}) rated by keywords")
+    for reason, count in reasons.most_common():
+        print(f"  {reason:>10} {count:>5} {count / len(texts):>6.0%}")
+    print(f"agreement with the sentiment model on keyword-rated texts: {agreement:.0%}")
+    for text, rating, model in disagreements:
+        print(f"  keywords {names.get(rating, rating)!s:>9}, model {names.get(model, model)!s:>9}: {text[:80]!r}")
+
+    keyword_seconds = time_per_text(keyword_rating.classify, texts, args.repeats)
+    model_seconds = time_per_text(model_rating, texts, 1)
+    print(f"per text: keywords {keyword_seconds * 1e6:.1f}us, model {model_seconds * 1000:.1f}ms")
+    return agreement
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="file with one feedback text per line")
+    parser.add_argument("--min-agreement", type=float, default=0.0)
+    parser.add_argument("--repeats", type=int, default=200, help="repeats for timing the keyword matcher")
+    args = parser.parse_args()
+    sys.exit(0 if main(args) >= args.min_agreement else 1)
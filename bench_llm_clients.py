@@ -0,0 +1,79 @@
+"""Per-call overhead of constructing ChatGroq on every call vs the shared client registry.
+
+Both variants call a local stub of the Groq API (stub_groq.py) with a fixed
+latency, so the difference in per-call time is pure client overhead: client
+construction, connection setup, and (against the real API) TLS handshakes,
+which the stub does not model and would widen the gap further.
+
+    python bench_llm_clients.py --calls 200 --concurrency 8 --latency-ms 20
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from stub_groq import StubGroqServer
+
+prompt = "Message: I feel like I always mess everything up.\nOnly respond with 'distortion' or 'chat'.\n"
+
+
+def per_call_client():
+    from langchain_groq import ChatGroq
+
+    # What classifier_node and summarize_history used to do on every turn
+    return ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model="mistral-saba-24b", temperature=0.3, max_tokens=20)
+
+
+def shared_client():
+    from llm_clients import get_llm
+
+    return get_llm("mistral-saba-24b", temperature=0.3, max_tokens=20)
+
+
+def run(make_client, calls, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        local = []
+        for _ in range(n):
+            start = time.perf_counter()
+            make_client().invoke(prompt)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(calls // concurrency,)) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    stub = StubGroqServer(latency_ms=args.latency_ms).start()
+    os.environ["GROQ_API_BASE"] = stub.url
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+
+    print(f"{args.calls} calls, {args.concurrency} concurrent, stub latency {args.latency_ms:g}ms")
+    print(f"{'client':>10} {'mean ms':>9} {'overhead ms':>12} {'p95 ms':>8} {'calls/s':>8} {'connections':>12}")
+    for name, make_client in (("per-call", per_call_client), ("shared", shared_client)):
+        make_client().invoke(prompt)  # warm-up: imports, first connection
+        connections = stub.connections
+        latencies, elapsed = run(make_client, args.calls, args.concurrency)
+        latencies.sort()
+        mean = statistics.mean(latencies) * 1000
+        print(
+            f"{name:>10} {mean:>9.2f} {mean - args.latency_ms:>12.2f} {latencies[int(len(latencies) * 0.95) - 1] * 1000:>8.2f} "
+            f"{len(latencies) / elapsed:>8.1f} {stub.connections - connections:>12}"
+        )
+    stub.shutdown()
@@ -0,0 +1,95 @@
+"""Chat latency during a burst of concurrent logins, with and without PASSWORD_OFFLOAD.
+
+Starts the server (like bench_serving.py, against the Groq stub and the Mongo
+at MONGO_URI) once per mode. --chat-sessions users chat continuously. The
+benchmark first measures their turn latency alone, then again while --logins
+logins hit /api/login at once. It reports chat p50/p95 for both phases, login
+latency, and how many logins were refused with 503 by the bounded queue.
+
+    python bench_login_burst.py --chat-sessions 20 --logins 200 --log-rounds 12
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import aiohttp
+
+from bench_serving import make_user, run_level
+from bench_startup import wait_for
+from stub_groq import StubGroqServer
+
+
+def summary(values):
+    values = sorted(values)
+    if not values:
+        return float("nan"), float("nan")
+    return statistics.median(values) * 1000, values[max(int(len(values) * 0.95) - 1, 0)] * 1000
+
+
+async def login(http, base_url, email):
+    start = time.perf_counter()
+    async with http.post(f"{base_url}/api/login", json={"email": email, "password": "bench-password"}) as response:
+        await response.read()
+        return response.status, time.perf_counter() - start
+
+
+async def bench(offload, args, stub_url):
+    env = dict(os.environ, PORT=str(args.port), USE_RELOADER="false", GROQ_API_BASE=stub_url,
+               PASSWORD_OFFLOAD=str(offload).lower(), BCRYPT_LOG_ROUNDS=str(args.log_rounds))
+    process = subprocess.Popen([sys.executable, args.server], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        await asyncio.to_thread(wait_for, f"{base_url}/api/ready", time.perf_counter() + args.startup_timeout)
+        run_id = uuid.uuid4().hex[:8]
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+            tokens = [await make_user(http, base_url, run_id, n) for n in range(args.chat_sessions)]
+            burst_email = f"bench-{run_id}-0@example.com"
+
+            baseline, _, _ = await run_level(base_url, tokens, args.turns, args.timeout)
+
+            async def burst():
+                await asyncio.sleep(args.burst_delay)
+                return await asyncio.gather(*(login(http, base_url, burst_email) for _ in range(args.logins)))
+
+            (during, _, _), logins = await asyncio.gather(run_level(base_url, tokens, args.turns, args.timeout), burst())
+
+        ok = [seconds for status, seconds in logins if status == 200]
+        refused = sum(status == 503 for status, _ in logins)
+        label = "offload" if offload else "inline"
+        for phase, values in (("chat alone", baseline), ("chat+burst", during), ("login", ok)):
+            p50, p95 = summary(values)
+            print(f"{label:>8} {phase:>11} {p50:>8.0f} {p95:>8.0f} {len(values):>6}")
+        print(f"{label:>8} {'refused':>11} {refused:>8}")
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+async def main(args):
+    stub = StubGroqServer(latency_ms=args.latency_ms, token_delay_ms=5).start()
+    print(f"{args.chat_sessions} chat sessions x {args.turns} turns, {args.logins} logins, BCRYPT_LOG_ROUNDS={args.log_rounds}")
+    print(f"{'mode':>8} {'':>11} {'p50 ms':>8} {'p95 ms':>8} {'count':>6}")
+    for offload in (False, True):
+        await bench(offload, args, stub.url)
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="server.py")
+    parser.add_argument("--chat-sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--log-rounds", type=int, default=12)
+    parser.add_argument("--burst-delay", type=float, default=0.5, help="seconds into the chat phase the burst starts")
+    parser.add_argument("--latency-ms", type=float, default=300, help="stub Groq latency per call")
+    parser.add_argument("--timeout", type=float, default=120, help="per-turn timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8767)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,144 @@
+"""Per-worker memory of the two BERT models by MODEL_DTYPE, and label agreement with float32.
+
+For each dtype, the benchmark forks --workers worker processes the way gunicorn
+does and has each one classify the compare_backends.py reference sets. Every page
+of the weights is touched that way, and the worker then reports its RSS, PSS
+(RSS with shared pages split between the processes sharing them) and private
+memory. Three setups are compared:
+
+    preload      models loaded once in the parent before forking (gunicorn.conf.py)
+    independent  each worker loads its own models after the fork
+    no-mmap      like independent, with MMAP_WEIGHTS=false
+
+Agreement is the share of reference texts whose label matches the float32 run.
+
+    python bench_memory.py --dtypes float32,bfloat16,float16 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv, find_dotenv
+
+from model_loader import ModelHandle
+from reference_texts import distortion_reference, sentiment_reference
+
+SETUPS = {
+    "preload": {"MMAP_WEIGHTS": "true"},
+    "independent": {"MMAP_WEIGHTS": "true"},
+    "no-mmap": {"MMAP_WEIGHTS": "false"},
+}
+
+
+def memory():
+    """RSS, PSS and private memory of this process in MB, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def classify(handle, texts):
+    labels = []
+    start = time.perf_counter()
+    for text in texts:
+        logits = handle.backend(handle.batcher.tokenize([text]))
+        labels.append(int(logits.argmax(dim=-1)[0]))
+    return labels, (time.perf_counter() - start) / len(texts) * 1000
+
+
+def load_handles():
+    # Built here rather than imported from utils, which would also start pymongo's monitor
+    # threads; forking while one of them is inside a libc lookup can deadlock the child
+    load_dotenv(find_dotenv())
+    bert = ModelHandle("bert", os.getenv("BERT_MODEL"), os.getenv("BERT_TOKENIZER"))
+    sentiment = ModelHandle("sentiment", os.getenv("SENTIMENT_MODEL"))
+    return bert, sentiment
+
+
+def worker(bert, sentiment, preload, write_fd):
+    if not preload:
+        bert.wait()
+        sentiment.wait()
+    distortion, distortion_ms = classify(bert, distortion_reference)
+    sentiments, sentiment_ms = classify(sentiment, sentiment_reference)
+    result = {"distortion": distortion, "sentiment": sentiments, "ms": (distortion_ms + sentiment_ms) / 2, **memory()}
+    with os.fdopen(write_fd, "w") as f:
+        json.dump(result, f)
+
+
+def run_workers(preload, workers):
+    """Fork `workers` workers from this process; returns their reports."""
+    bert, sentiment = load_handles()
+    start = time.perf_counter()
+    if preload:
+        bert.wait()
+        sentiment.wait()
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                worker(bert, sentiment, preload, write_fd)
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+    reports = []
+    # Read every report before reaping, so all workers are alive (and sharing pages) when measured
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as f:
+            reports.append(json.loads(f.read()))
+    for pid, _ in children:
+        os.waitpid(pid, 0)
+    return {"workers": reports, "seconds": time.perf_counter() - start, "parent": memory()}
+
+
+def agreement(labels, reference):
+    return sum(a == b for a, b in zip(labels, reference)) / len(reference)
+
+
+def main(args):
+    print(f"{args.workers} workers; MB per worker, total PSS includes the parent")
+    print(f"{'MODEL_DTYPE':>11} {'setup':>11} {'RSS':>7} {'PSS':>7} {'private':>7} {'total PSS':>9} "
+          f"{'ms/msg':>7} {'distortion':>10} {'sentiment':>9}")
+    reference = None
+    for dtype in args.dtypes:
+        for setup in args.setups:
+            env = dict(os.environ, MODEL_DTYPE=dtype, **SETUPS[setup])
+            command = [sys.executable, __file__, "--run", setup, "--workers", str(args.workers)]
+            result = json.loads(subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1])
+            reports = result["workers"]
+            if reference is None:
+                reference = reports[0]  # first run is the float32 baseline
+            mean = {key: sum(r[key] for r in reports) / len(reports) for key in ("rss", "pss", "private", "ms")}
+            total = sum(r["pss"] for r in reports) + result["parent"]["pss"]
+            print(f"{dtype:>11} {setup:>11} {mean['rss']:>7.0f} {mean['pss']:>7.0f} {mean['private']:>7.0f} {total:>9.0f} "
+                  f"{mean['ms']:>7.1f} {agreement(reports[0]['distortion'], reference['distortion']):>10.0%} "
+                  f"{agreement(reports[0]['sentiment'], reference['sentiment']):>9.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dtypes", default="float32,bfloat16,float16", type=lambda s: s.split(","), help="float32 first: it is the reference")
+    parser.add_argument("--setups", default="preload,independent,no-mmap", type=lambda s: s.split(","))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--run", choices=list(SETUPS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_workers(args.run == "preload", args.workers)))
+    else:
+        main(args)
@@ -0,0 +1,129 @@
+"""Concurrent-session capacity of server.py (threaded) vs async_server.py (asyncio).
+
+Starts each server as a subprocess against a local Groq stub (stub_groq.py) with
+a fixed latency, signs up one user per session, then at each concurrency level
+has every session send `--turns` chat messages at once over Socket.IO and waits
+for each reply. A level passes when every turn completes and p95 turn latency
+stays under `--slo-ms`; the highest passing level is the server's capacity.
+Needs a Mongo instance at MONGO_URI (use a throwaway database) and the models
+from .env, like the servers themselves.
+
+    python bench_serving.py --levels 25,50,100,200,400 --latency-ms 300
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import aiohttp
+import socketio
+
+from bench_startup import wait_for
+from stub_groq import StubGroqServer
+
+
+async def make_user(http, base_url, run_id, n):
+    email = f"bench-{run_id}-{n}@example.com"
+    credentials = {"email": email, "password": "bench-password"}
+    async with http.post(f"{base_url}/api/signup", json={"name": f"Bench {n}", **credentials}) as response:
+        response.raise_for_status()
+    async with http.post(f"{base_url}/api/login", json=credentials) as response:
+        response.raise_for_status()
+        return (await response.json())["token"]
+
+
+async def session(base_url, token, turns, timeout, latencies):
+    client = socketio.AsyncClient()
+    replies = asyncio.Queue()
+    client.on("receive_message", replies.put)
+    await client.connect(base_url, auth={"token": token}, transports=["websocket"], wait_timeout=timeout)
+    try:
+        for turn in range(turns):
+            message = {
+                "content": f"I keep thinking everyone at work thinks I'm useless ({turn})",
+                "timestamp": datetime.datetime.now().isoformat(),
+                "type": "text",
+            }
+            start = time.perf_counter()
+            await client.emit("send_message", {"userMessage": message})
+            await asyncio.wait_for(replies.get(), timeout)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await client.disconnect()
+
+
+async def run_level(base_url, tokens, turns, timeout):
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(session(base_url, token, turns, timeout, latencies) for token in tokens), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    errors = sum(isinstance(r, BaseException) for r in results)
+    return latencies, errors, elapsed
+
+
+async def bench(script, args, stub_url):
+    # Lift the global LLM bound so the serving model, not the slot count, is what saturates
+    env = dict(os.environ, PORT=str(args.port), USE_RELOADER="false", GROQ_API_BASE=stub_url,
+               LLM_MAX_CONCURRENCY=str(args.llm_concurrency), GROQ_MAX_CONNECTIONS=str(args.llm_concurrency))
+    process = subprocess.Popen([sys.executable, script], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        await asyncio.to_thread(wait_for, f"{base_url}/api/ready", time.perf_counter() + args.startup_timeout)
+        run_id = uuid.uuid4().hex[:8]
+        async with aiohttp.ClientSession() as http:
+            tokens = [await make_user(http, base_url, run_id, n) for n in range(max(args.levels))]
+
+        capacity = 0
+        for level in args.levels:
+            latencies, errors, elapsed = await run_level(base_url, tokens[:level], args.turns, args.timeout)
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+            p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000 if latencies else float("nan")
+            passed = errors == 0 and len(latencies) == level * args.turns and p95 <= args.slo_ms
+            if passed:
+                capacity = level
+            print(
+                f"{script:>16} {level:>8} {len(latencies):>6} {errors:>7} {p50:>8.0f} {p95:>8.0f} "
+                f"{len(latencies) / elapsed:>8.1f} {'ok' if passed else 'FAIL':>5}"
+            )
+            if not passed:
+                break
+        return capacity
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+async def main(args):
+    stub = StubGroqServer(latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms).start()
+    print(f"stub latency {args.latency_ms:g}ms, {args.turns} turns per session, SLO p95 <= {args.slo_ms:g}ms")
+    print(f"{'server':>16} {'sessions':>8} {'turns':>6} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'turns/s':>8} {'':>5}")
+    capacities = {}
+    for script in args.servers:
+        capacities[script] = await bench(script, args, stub.url)
+    stub.shutdown()
+    for script, capacity in capacities.items():
+        print(f"{script}: {capacity} concurrent sessions within the SLO")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", default="server.py,async_server.py", type=lambda s: s.split(","))
+    parser.add_argument("--levels", default="25,50,100,200,400", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=300, help="stub Groq latency per call")
+    parser.add_argument("--token-delay-ms", type=float, default=5, help="stub delay between streamed tokens")
+    parser.add_argument("--llm-concurrency", type=int, default=256, help="LLM_MAX_CONCURRENCY for the servers")
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p95 turn latency a level must stay under")
+    parser.add_argument("--timeout", type=float, default=60, help="per-turn timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8766)
+    asyncio.run(main(parser.parse_args()))
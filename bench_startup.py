@@ -0,0 +1,61 @@
+"""Import-to-first-response time of server.py with eager vs background model loading.
+
+Starts `python server.py` as a subprocess for each MODEL_WARMUP mode and measures
+how long it takes until `/` answers (the port is bound and serving) and until
+`/api/ready` reports both BERT models loaded.
+
+    python bench_startup.py --runs 3
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def wait_for(url, deadline, process=None):
+    """Poll `url` until it answers 200; raises RuntimeError at once if `process` exits first."""
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode} before {url} responded")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not respond in time")
+
+
+def measure(mode, port, timeout):
+    env = dict(os.environ, MODEL_WARMUP=mode, PORT=str(port), USE_RELOADER="false")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "server.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        deadline = start + timeout
+        first_response = wait_for(f"http://127.0.0.1:{port}/", deadline, process) - start
+        ready = wait_for(f"http://127.0.0.1:{port}/api/ready", deadline, process) - start
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+    return first_response, ready
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    print(f"{'MODEL_WARMUP':>13} {'first response s':>17} {'models ready s':>15}")
+    for mode in ("eager", "background"):
+        results = [measure(mode, args.port, args.timeout) for _ in range(args.runs)]
+        first = statistics.median(r[0] for r in results)
+        ready = statistics.median(r[1] for r in results)
+        print(f"{mode:>13} {first:>17.2f} {ready:>15.2f}")
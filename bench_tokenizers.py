@@ -0,0 +1,106 @@
+"""Pure-Python vs Rust-backed (fast) BERT tokenizers: identical ids, and how much faster.
+
+Loads both tokenizer implementations for the distortion and sentiment models
+(paths from .env, like utils.py). It first checks that they produce the same
+input ids and attention masks on the compare_backends.py reference sets, on
+unicode and edge-case inputs, and on long texts that hit the 512-token
+truncation. Then it times one text per call and whole batches per call across
+message lengths; long journal feedback is the case that matters. Exits with
+status 1 if any ids differ.
+
+    python bench_tokenizers.py --lengths 8,32,128,512,2000 --batch-size 16
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from compare_backends import distortion_reference, sentiment_reference
+from model_loader import tokenizer_class
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "I'm SO tired of this!!! 😞😞",
+    "Café naïve résumé — “quotes” and ‘apostrophes’",
+    "don't won't can't shouldn't",
+    "multiple\nlines\n\nand\ttabs",
+    "URLs like https://example.com/a?b=c and emails a@b.co",
+    "数字 1234567890 and 3.14159",
+]
+
+
+def text_of_length(words):
+    """Roughly `words` words of journal-like text."""
+    pool = " ".join(sentiment_reference + distortion_reference).split()
+    return " ".join(pool[i % len(pool)] for i in range(words))
+
+
+def encode(tokenizer, texts, max_length):
+    return tokenizer(texts, padding=True, truncation=True, max_length=max_length)
+
+
+def check_ids(slow, fast, texts, max_length):
+    """Texts whose ids or attention mask differ between the two tokenizers."""
+    mismatches = []
+    for text in texts:
+        a, b = encode(slow, [text], max_length), encode(fast, [text], max_length)
+        if a["input_ids"] != b["input_ids"] or a["attention_mask"] != b["attention_mask"]:
+            mismatches.append(text)
+    # Batch padding must line up too
+    a, b = encode(slow, texts, max_length), encode(fast, texts, max_length)
+    if a["input_ids"] != b["input_ids"]:
+        mismatches.append("<batch>")
+    return mismatches
+
+
+def time_calls(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def bench(name, path, args):
+    slow = tokenizer_class(fast=False).from_pretrained(path, token=os.getenv("HF_TOKEN"))
+    fast = tokenizer_class(fast=True).from_pretrained(path, token=os.getenv("HF_TOKEN"))
+    if slow.is_fast or not fast.is_fast:
+        sys.exit(f"{name}: could not load both a pure-Python and a fast tokenizer from {path}")
+
+    texts = distortion_reference + sentiment_reference + EDGE_CASES + [text_of_length(n) for n in args.lengths]
+    mismatches = check_ids(slow, fast, texts, args.max_length)
+    print(f"{name}: {len(texts) - len(mismatches)}/{len(texts)} texts tokenize identically")
+    for text in mismatches:
+        print(f"  differs: {text[:80]!r}")
+
+    print(f"{'model':>10} {'words':>6} {'tokens':>6} {'slow ms':>8} {'fast ms':>8} {'speedup':>8} "
+          f"{'slow batch':>10} {'fast batch':>10} {'speedup':>8}")
+    for words in args.lengths:
+        text = text_of_length(words)
+        batch = [f"{text} ({i})" for i in range(args.batch_size)]
+        tokens = len(fast(text, truncation=True, max_length=args.max_length)["input_ids"])
+        # One call per text, as compare_backends.py does, vs the batcher's one call per batch
+        slow_one = time_calls(lambda: slow(text, return_tensors="pt", truncation=True, max_length=args.max_length), args.repeats)
+        fast_one = time_calls(lambda: fast(text, return_tensors="pt", truncation=True, max_length=args.max_length), args.repeats)
+        slow_batch = time_calls(lambda: slow(batch, return_tensors="pt", padding=True, truncation=True, max_length=args.max_length), args.repeats)
+        fast_batch = time_calls(lambda: fast(batch, return_tensors="pt", padding=True, truncation=True, max_length=args.max_length), args.repeats)
+        print(f"{name:>10} {words:>6} {tokens:>6} {slow_one:>8.2f} {fast_one:>8.2f} {slow_one / fast_one:>7.1f}x "
+              f"{slow_batch:>10.2f} {fast_batch:>10.2f} {slow_batch / fast_batch:>7.1f}x")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="8,32,128,512,2000", type=lambda s: [int(x) for x in s.split(",")], help="message lengths in words")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    ok = True
+    for name, path in (("bert", os.getenv("BERT_TOKENIZER")), ("sentiment", os.getenv("SENTIMENT_MODEL"))):
+        ok = bench(name, path, args) and ok
+    sys.exit(0 if ok else 1)
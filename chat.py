@@ -7,7 +7,7 @@ from transformers import BertTokenizer, BertForSequenceClassification
 import os
 import groq
 from langgraph.graph import MessagesState
-from flask import Flask, render_template
+from flask import Flask, render_template, request
 from flask_socketio import SocketIO, emit
 from pymongo import MongoClient
 import datetime
@@ -252,7 +252,7 @@ def handle_message(json_data):
         "conversation": conversation_data["conversation"],
         "task": conversation_data["task"],
         "user_id": user_id
-    })
+    }, to=request.sid)
 
 @socketio.on("complete_session")
 def handle_complete_session(json_data):
@@ -273,7 +273,7 @@ def handle_complete_session(json_data):
         upsert=True
     )
 
-    socketio.emit("session_complete", {"report": report})
+    socketio.emit("session_complete", {"report": report}, to=request.sid)
 
 if __name__ == "__main__":
     socketio.run(app, host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,65 @@
+"""Accuracy vs latency of the inference backends on a reference set.
+
+Runs the distortion and sentiment models through the torch, onnx and onnx-int8
+backends, reports mean per-message latency and checks that each backend's
+labels (as names from `label_map` / `senti_mapping`) agree with the fp32 torch
+predictions. Exits with status 1 if agreement drops below --min-agreement.
+
+    python compare_backends.py --backends torch onnx onnx-int8 --min-agreement 0.95
+"""
+import argparse
+import sys
+import time
+
+import torch
+
+from backends import load_backend
+from reference_texts import distortion_reference, sentiment_reference
+from utils import bert, sentiment, warm_up, label_map, senti_mapping
+
+
+def predict(backend, tokenizer, texts):
+    labels = []
+    start = time.perf_counter()
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        labels.append(torch.argmax(backend(inputs), dim=-1).item())
+    return labels, (time.perf_counter() - start) / len(texts) * 1000
+
+
+def compare(title, handle, texts, names, kinds):
+    print(f"\n{title} ({len(texts)} reference messages)")
+    print(f"{'backend':>10} {'ms/msg':>8} {'speedup':>8} {'agreement':>10}")
+    reference, reference_ms = None, None
+    worst = 1.0
+    for kind in kinds:
+        backend = load_backend(handle.model, handle.tokenizer, handle.model_path, kind, handle.revision)
+        predict(backend, handle.tokenizer, texts[:2])  # warm-up
+        labels, ms = predict(backend, handle.tokenizer, texts)
+        if reference is None:
+            reference, reference_ms = labels, ms
+        agreement = sum(a == b for a, b in zip(labels, reference)) / len(texts)
+        worst = min(worst, agreement)
+        print(f"{kind:>10} {ms:>8.2f} {reference_ms / ms:>7.2f}x {agreement:>10.0%}")
+        for text, got, want in zip(texts, labels, reference):
+            if got != want:
+                print(f"{'':>10} mismatch: {names[got]!r} != {names[want]!r} for {text!r}")
+    return worst
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"], help="first one is the reference")
+    parser.add_argument("--min-agreement", type=float, default=0.9)
+    args = parser.parse_args()
+
+    warm_up()
+    senti_names = {v: k for k, v in senti_mapping.items()}
+    worst = min(
+        compare("Cognitive distortion", bert, distortion_reference, label_map, args.backends),
+        compare("Journal sentiment", sentiment, sentiment_reference, senti_names, args.backends),
+    )
+    if worst < args.min_agreement:
+        print(f"\nFAIL: agreement {worst:.0%} is below {args.min_agreement:.0%}")
+        sys.exit(1)
+    print(f"\nOK: every backend agrees with the reference on at least {worst:.0%} of messages")
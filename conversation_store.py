@@ -0,0 +1,162 @@
+import datetime
+import os
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from db import async_collection, conversation_buckets_collection
+
+# Chat messages are stored in fixed-size bucket documents per user instead of one
+# ever-growing array, so no document gets anywhere near Mongo's 16MB limit.
+bucket_size = int(os.getenv("CONVERSATION_BUCKET_SIZE", 100))
+# Most messages GET /api/conversations returns per page
+max_page_size = 200
+
+
+def make_bucket(user_id, seq, messages):
+    return {
+        "user_id": user_id,
+        "seq": seq,
+        "count": len(messages),
+        "messages": messages,
+        "updated_at": datetime.datetime.utcnow(),
+    }
+
+
+def _append_update(entries):
+    return {
+        "$push": {"messages": {"$each": entries}},
+        "$inc": {"count": len(entries)},
+        "$set": {"updated_at": datetime.datetime.utcnow()},
+    }
+
+
+def append_messages(user_id, entries):
+    """Append `entries` to the user's newest bucket, opening a new bucket when it is full."""
+    while True:
+        newest = conversation_buckets_collection.find_one(
+            {"user_id": user_id}, {"seq": 1, "count": 1}, sort=[("seq", DESCENDING)]
+        )
+        if newest and newest["count"] + len(entries) <= bucket_size:
+            # The count condition makes this safe against a concurrent append filling the bucket
+            result = conversation_buckets_collection.update_one(
+                {"_id": newest["_id"], "count": {"$lte": bucket_size - len(entries)}}, _append_update(entries)
+            )
+            if result.modified_count:
+                return
+            continue
+
+        seq = newest["seq"] + 1 if newest else 0
+        try:
+            conversation_buckets_collection.insert_one(make_bucket(user_id, seq, entries))
+            return
+        except DuplicateKeyError:
+            # Another append opened this bucket first; retry against it
+            continue
+
+
+async def aappend_messages(user_id, entries):
+    """`append_messages` on the async client."""
+    while True:
+        newest = await async_collection("conversation_buckets").find_one(
+            {"user_id": user_id}, {"seq": 1, "count": 1}, sort=[("seq", DESCENDING)]
+        )
+        if newest and newest["count"] + len(entries) <= bucket_size:
+            result = await async_collection("conversation_buckets").update_one(
+                {"_id": newest["_id"], "count": {"$lte": bucket_size - len(entries)}}, _append_update(entries)
+            )
+            if result.modified_count:
+                return
+            continue
+
+        seq = newest["seq"] + 1 if newest else 0
+        try:
+            await async_collection("conversation_buckets").insert_one(make_bucket(user_id, seq, entries))
+            return
+        except DuplicateKeyError:
+            continue
+
+
+def has_messages(user_id):
+    return conversation_buckets_collection.find_one({"user_id": user_id}, {"_id": 1}) is not None
+
+
+async def ahas_messages(user_id):
+    return await async_collection("conversation_buckets").find_one({"user_id": user_id}, {"_id": 1}) is not None
+
+
+def encode_cursor(seq, index):
+    return f"{seq}:{index}"
+
+
+def decode_cursor(cursor):
+    """(seq, index) from a cursor; raises ValueError if it isn't one.
+
+    seq may be negative: migrate_conversations.py numbers old history before a user's
+    existing buckets.
+    """
+    seq, index = (int(part) for part in cursor.split(":"))
+    if index < 0:
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return seq, index
+
+
+def page_args(before, limit):
+    """Validate the `before` and `limit` query parameters of GET /api/conversations.
+
+    Returns them with limit clamped to 1..max_page_size; raises ValueError for a
+    malformed cursor or a limit that isn't an integer.
+    """
+    if before:
+        decode_cursor(before)
+    return before, min(max(int(limit), 1), max_page_size)
+
+
+def get_page(user_id, before=None, limit=50):
+    """Return up to `limit` messages older than the `before` cursor (newest page when omitted).
+
+    Messages come back oldest first, together with the cursor for the next (older) page,
+    which is None once the start of the conversation has been reached.
+    """
+    query = {"user_id": user_id}
+    before_seq, before_index = decode_cursor(before) if before else (None, None)
+    if before_seq is not None:
+        query["seq"] = {"$lte": before_seq}
+
+    page = []
+    next_cursor = None
+    for bucket in conversation_buckets_collection.find(query).sort("seq", DESCENDING):
+        messages = bucket["messages"]
+        end = before_index if bucket["seq"] == before_seq else len(messages)
+        start = max(end - (limit - len(page)), 0)
+        page[:0] = messages[start:end]
+        if len(page) >= limit:
+            older = conversation_buckets_collection.find_one({"user_id": user_id, "seq": {"$lt": bucket["seq"]}}, {"_id": 1})
+            if start > 0 or older:
+                next_cursor = encode_cursor(bucket["seq"], start)
+            break
+
+    return page, next_cursor
+
+
+async def aget_page(user_id, before=None, limit=50):
+    """`get_page` on the async client."""
+    query = {"user_id": user_id}
+    before_seq, before_index = decode_cursor(before) if before else (None, None)
+    if before_seq is not None:
+        query["seq"] = {"$lte": before_seq}
+
+    page = []
+    next_cursor = None
+    async for bucket in async_collection("conversation_buckets").find(query).sort("seq", DESCENDING):
+        messages = bucket["messages"]
+        end = before_index if bucket["seq"] == before_seq else len(messages)
+        start = max(end - (limit - len(page)), 0)
+        page[:0] = messages[start:end]
+        if len(page) >= limit:
+            older = await async_collection("conversation_buckets").find_one({"user_id": user_id, "seq": {"$lt": bucket["seq"]}}, {"_id": 1})
+            if start > 0 or older:
+                next_cursor = encode_cursor(bucket["seq"], start)
+            break
+
+    return page, next_cursor
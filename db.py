@@ -0,0 +1,67 @@
+import os
+import threading
+from dotenv import load_dotenv, find_dotenv
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+
+import metrics
+
+load_dotenv(find_dotenv())
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Records every command's server round trip in mongo_command_seconds{command, collection}."""
+
+    def __init__(self):
+        # (connection, request id) -> collection; only the started event carries the command body
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        return {"command": event.command_name, "collection": collection}
+
+    def succeeded(self, event):
+        metrics.mongo_seconds.observe(event.duration_micros / 1e6, **self._finish(event))
+
+    def failed(self, event):
+        labels = self._finish(event)
+        metrics.mongo_seconds.observe(event.duration_micros / 1e6, **labels)
+        metrics.mongo_errors.inc(**labels)
+
+
+command_timer = CommandTimer()
+
+# Shared Mongo connection. MongoClient connects lazily, so importing this is cheap.
+mongo_uri = os.getenv("MONGO_URI")
+mongo_client = MongoClient(mongo_uri, event_listeners=[command_timer])
+db = mongo_client["chat_db"]
+conversations_collection = db["conversations"]
+tasks_collection = db["tasks"]
+journal_reports_collection = db["journal_reports"]
+users_collection = db["users"]
+checkpoints_collection = db["checkpoints"]
+checkpoint_writes_collection = db["checkpoint_writes"]
+conversation_buckets_collection = db["conversation_buckets"]
+
+# Native asyncio client for async_server.py, created on first use so server.py (sync client
+# only) never starts one
+_async_db = None
+_async_db_lock = threading.Lock()
+
+
+def get_async_db():
+    global _async_db
+    with _async_db_lock:
+        if _async_db is None:
+            _async_db = AsyncMongoClient(mongo_uri, event_listeners=[command_timer])["chat_db"]
+    return _async_db
+
+
+def async_collection(name):
+    return get_async_db()[name]
@@ -0,0 +1,138 @@
+"""Journal feedback processed in the background instead of inside the HTTP request.
+
+POST /api/feedback/<taskId> stores the feedback and a job on the task document
+and answers 202 with the job id at once. A worker then runs journal_report,
+which computes the sentiment rating and the LLM summary concurrently. It
+completes the task and the server pushes `feedback_processed` to the user's
+room. GET /api/feedback/jobs/<jobId> returns the same payload for clients that
+missed the event. The job lives on the task document, so any server process
+can answer the poll. While a job for the task is queued or running, another
+POST is not recorded and answers 409 with that job, so the client can resubmit
+after it finishes.
+"""
+import datetime
+import os
+import uuid
+
+from db import async_collection, tasks_collection
+from model import ajournal_report, journal_report
+
+# A job still queued or running after this long is treated as lost (e.g. its worker restarted),
+# and the feedback can be submitted again
+job_timeout = float(os.getenv("FEEDBACK_JOB_TIMEOUT", 300))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def _now():
+    # ISO strings rather than datetimes: /api/tasks and /api/singleTask return the task
+    # documents as JSON, and aiohttp's json_response can't encode a datetime
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _new_job(task_id, feedback):
+    """(filter, update, job) recording a new job, unless the task has one still queued or running."""
+    lost = (datetime.datetime.utcnow() - datetime.timedelta(seconds=job_timeout)).isoformat()
+    job = {"id": uuid.uuid4().hex, "status": QUEUED, "submitted_at": _now()}
+    query = {"_id": task_id, "$or": [
+        {"feedback_job.status": {"$nin": [QUEUED, RUNNING]}},  # also matches tasks without a job
+        {"feedback_job.submitted_at": {"$lt": lost}},
+    ]}
+    return query, {"$set": {"feedback": feedback, "feedback_job": job}}, job
+
+
+def _running():
+    return {"$set": {"feedback_job.status": RUNNING, "feedback_job.started_at": _now()}}
+
+
+def _done(response):
+    return {"$set": {
+        "summary": response["ai_feedback"],
+        "rating": response["rating"],
+        "completed": True,
+        "feedback_job.status": DONE,
+        "feedback_job.finished_at": _now(),
+    }}
+
+
+def _failed(error):
+    return {"$set": {"feedback_job.status": FAILED, "feedback_job.error": error, "feedback_job.finished_at": _now()}}
+
+
+def payload(task_id, job_id, status, summary=None, rating=None, error=None):
+    """The body of `feedback_processed` and of the status endpoint."""
+    return {"jobId": job_id, "taskId": str(task_id), "status": status, "summary": summary, "rating": rating, "error": error}
+
+
+def _from_task(task_doc):
+    job = task_doc["feedback_job"]
+    return payload(task_doc["_id"], job["id"], job["status"], task_doc.get("summary"), task_doc.get("rating"), job.get("error"))
+
+
+def submit(task_doc, feedback):
+    """Record a job for the feedback; returns (job, created). While another job for the task
+    is queued or running, that job is returned instead and nothing is written."""
+    query, update, job = _new_job(task_doc["_id"], feedback)
+    # One conditional write, so two concurrent submissions can't both create a job
+    if tasks_collection.find_one_and_update(query, update) is not None:
+        return job, True
+    return tasks_collection.find_one({"_id": task_doc["_id"]})["feedback_job"], False
+
+
+async def asubmit(task_doc, feedback):
+    query, update, job = _new_job(task_doc["_id"], feedback)
+    if await async_collection("tasks").find_one_and_update(query, update) is not None:
+        return job, True
+    return (await async_collection("tasks").find_one({"_id": task_doc["_id"]}))["feedback_job"], False
+
+
+def fail(task_id, job_id, error):
+    """Mark the job failed; returns its payload, or None if the job was superseded."""
+    result = tasks_collection.update_one({"_id": task_id, "feedback_job.id": job_id}, _failed(error))
+    return payload(task_id, job_id, FAILED, error=error) if result.matched_count else None
+
+
+async def afail(task_id, job_id, error):
+    result = await async_collection("tasks").update_one({"_id": task_id, "feedback_job.id": job_id}, _failed(error))
+    return payload(task_id, job_id, FAILED, error=error) if result.matched_count else None
+
+
+def run(task_doc, feedback, job_id):
+    """Rate and summarize the feedback and complete the task; returns the `feedback_processed`
+    payload, or None if a newer job replaced this one (after the timeout) and nothing was saved."""
+    job_filter = {"_id": task_doc["_id"], "feedback_job.id": job_id}
+    if not tasks_collection.update_one(job_filter, _running()).matched_count:
+        return None
+    try:
+        response = journal_report(feedback, task_doc["description"])
+    except Exception as e:
+        print(f"feedback job {job_id} failed: {e}")
+        return fail(task_doc["_id"], job_id, str(e))
+    if not tasks_collection.update_one(job_filter, _done(response)).matched_count:
+        return None
+    return payload(task_doc["_id"], job_id, DONE, response["ai_feedback"], response["rating"])
+
+
+async def arun(task_doc, feedback, job_id):
+    job_filter = {"_id": task_doc["_id"], "feedback_job.id": job_id}
+    if not (await async_collection("tasks").update_one(job_filter, _running())).matched_count:
+        return None
+    try:
+        response = await ajournal_report(feedback, task_doc["description"])
+    except Exception as e:
+        print(f"feedback job {job_id} failed: {e}")
+        return await afail(task_doc["_id"], job_id, str(e))
+    if not (await async_collection("tasks").update_one(job_filter, _done(response))).matched_count:
+        return None
+    return payload(task_doc["_id"], job_id, DONE, response["ai_feedback"], response["rating"])
+
+
+def get(job_id, user_id):
+    """The job's payload, or None if there is no such job on one of the user's tasks."""
+    task_doc = tasks_collection.find_one({"feedback_job.id": job_id, "user_id": user_id})
+    return _from_task(task_doc) if task_doc else None
+
+
+async def aget(job_id, user_id):
+    task_doc = await async_collection("tasks").find_one({"feedback_job.id": job_id, "user_id": user_id})
+    return _from_task(task_doc) if task_doc else None
@@ -0,0 +1,49 @@
+"""gunicorn settings for server.py that load the BERT models once, before the workers fork.
+
+    gunicorn -c gunicorn.conf.py server:app
+
+when_ready runs in the master and loads only the model handles (model_handles.py),
+which create no Mongo client, password pool or other background thread. Every
+worker is then forked with the weights already in memory and shares their
+physical pages copy-on-write instead of loading its own copy; weights are never
+written, so the pages stay shared. server.py itself is imported in each worker
+after the fork (no preload_app), so its Mongo clients, indexes and password pool
+belong to that worker alone.
+
+Socket.IO rooms live in the worker that accepted the connection, and gunicorn has
+no sticky sessions. One worker is the default. More workers need
+SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0, with pip install redis)
+so an event emitted by any worker reaches every room, plus clients that connect
+with the websocket transport only, because a polling handshake can't be split
+across workers.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+# Flask-SocketIO's threading mode; long-lived websockets each hold a thread
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 100))
+timeout = 120
+
+if workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+    raise RuntimeError("WEB_CONCURRENCY > 1 requires SOCKETIO_MESSAGE_QUEUE, or Socket.IO events are lost between workers")
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked
+    from model_handles import bert, sentiment
+
+    for handle in (bert, sentiment):
+        handle.wait()
+    server.log.info("models loaded, forking workers")
+
+
+def post_fork(server, worker):
+    # The worker has a single thread at this point: fork the password processes now,
+    # before server.py's Mongo clients start their monitor threads
+    import passwords
+    from indexes import ensure_indexes
+
+    passwords.start_pool()
+    ensure_indexes()
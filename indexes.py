@@ -0,0 +1,158 @@
+"""Indexes required by the hot queries in server.py.
+
+`ensure_indexes()` creates every declared index that doesn't exist yet and runs
+at server startup. A unique index can't be built while the collection holds
+duplicate values (e.g. users that signed up twice before email_unique existed):
+startup then logs an error, keeps serving without that index, and `--check`
+lists the duplicates to clean up. An existing index on the same keys with other
+options is only replaced once the new one can be built. `--check` also runs
+`explain()` on each hot query and fails if any of them does a collection scan.
+The checkpoint collections are indexed by MongoSaver.setup() itself.
+
+    python indexes.py            # create missing indexes
+    python indexes.py --check    # list duplicates and verify the hot queries use the indexes
+"""
+import argparse
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from db import db
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "conversations": [
+        # get_conversations and deliver_reply both upsert this document; unique makes the
+        # server retry the losing upsert instead of inserting a second state document
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique"),
+    ],
+    "conversation_buckets": [
+        IndexModel([("user_id", ASCENDING), ("seq", DESCENDING)], unique=True, name="user_id_seq"),
+    ],
+    "tasks": [
+        # Also serves the user_id-only lookup in /api/tasks through its prefix
+        IndexModel([("user_id", ASCENDING), ("completed", ASCENDING)], name="user_id_completed"),
+        # Feedback job status polls (only tasks that ever had feedback submitted are indexed)
+        IndexModel([("feedback_job.id", ASCENDING)], sparse=True, name="feedback_job_id"),
+    ],
+}
+
+# (collection, filter, sort) for every query that runs per request or per chat message
+HOT_QUERIES = [
+    ("users", {"email": "someone@example.com"}, None),
+    ("conversations", {"user_id": "0"}, None),
+    ("conversation_buckets", {"user_id": "0"}, [("seq", DESCENDING)]),
+    ("conversation_buckets", {"user_id": "0", "seq": {"$lte": 3}}, [("seq", DESCENDING)]),
+    ("tasks", {"user_id": "0"}, None),
+    ("tasks", {"user_id": "0", "completed": False}, None),
+    ("tasks", {"feedback_job.id": "0", "user_id": "0"}, None),
+]
+
+
+_ensured = set()
+
+
+def find_duplicates(collection, model, limit=10):
+    """Up to `limit` groups of documents sharing the keys of the unique index `model`."""
+    fields = list(model.document["key"])
+    return list(collection.aggregate([
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ], allowDiskUse=True))
+
+
+def _ensure_index(collection, model):
+    """Create `model` unless it exists. Returns False if duplicates keep a unique index from being built."""
+    name = model.document["name"]
+    existing = collection.index_information()
+    if name in existing:
+        return True
+    keys = list(model.document["key"].items())
+    replaced = [other for other, spec in existing.items() if other != name and spec["key"] == keys]
+    # Check before dropping the index being replaced, so its queries stay indexed if the build fails
+    if replaced and model.document.get("unique") and find_duplicates(collection, model, limit=1):
+        return False
+    for other in replaced:
+        collection.drop_index(other)
+    try:
+        collection.create_indexes([model])
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def ensure_indexes(database=db):
+    # Once per process: gunicorn's post_fork and the server.py import both call it
+    if database.name in _ensured:
+        return
+    for name, models in INDEXES.items():
+        for model in models:
+            if not _ensure_index(database[name], model):
+                print(f"ERROR: unique index {name}.{model.document['name']} not built: the collection has "
+                      f"duplicate values. Run `python indexes.py --check` to list them.")
+    _ensured.add(database.name)
+
+
+def check_duplicates(database=db):
+    """Return (collection, index name, duplicate groups) for every unique index the data violates."""
+    failures = []
+    for name, models in INDEXES.items():
+        for model in models:
+            if model.document.get("unique"):
+                duplicates = find_duplicates(database[name], model)
+                if duplicates:
+                    failures.append((name, model.document["name"], duplicates))
+    return failures
+
+
+def _stages(plan):
+    # Walk every nested plan stage (inputStage, inputStages, queryPlan, ...)
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+def check_indexes(database=db):
+    """Return a list of (collection, filter) pairs whose winning plan is a collection scan."""
+    failures = []
+    for name, filter_, sort in HOT_QUERIES:
+        cursor = database[name].find(filter_)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = set(_stages(plan))
+        print(f"{name:>22} {str(filter_):<45} {', '.join(sorted(stages))}")
+        if "COLLSCAN" in stages:
+            failures.append((name, filter_))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="list duplicates that block unique indexes, explain the hot queries and fail on either")
+    args = parser.parse_args()
+
+    if not args.check:
+        ensure_indexes()
+        print("Indexes are up to date")
+        sys.exit(0)
+
+    duplicates = check_duplicates()
+    for name, index, groups in duplicates:
+        for group in groups:
+            print(f"DUPLICATE: {name}.{index} {group['_id']} x{group['count']}")
+    failures = check_indexes()
+    for name, filter_ in failures:
+        print(f"COLLSCAN: {name} {filter_}")
+    if duplicates or failures:
+        sys.exit(1)
+    print("OK: no duplicates break a unique index and no hot query does a collection scan")
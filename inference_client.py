@@ -0,0 +1,154 @@
+"""Client side of inference_server.py: the BERT models answered over a Unix socket.
+
+Requests and responses are a fixed little-endian header followed by a payload,
+so any number of predictions can be in flight on one connection:
+
+    request   u32 request id | u8 model (0 bert, 1 sentiment, 255 ping) | u32 length | UTF-8 text
+    response  u32 request id | u8 status (0 ok, 1 error) | u32 length | float32 logits or UTF-8 error
+
+With INFERENCE_SERVER_SOCKET set, utils.py makes `bert` and `sentiment`
+RemoteModels, so every prediction in model.py goes to the inference server.
+"""
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+import metrics
+from model_loader import ModelHandle
+
+REQUEST = struct.Struct("<IBI")
+RESPONSE = struct.Struct("<IBI")
+MODELS = {"bert": 0, "sentiment": 1}
+PING = 255
+OK, ERROR = 0, 1
+
+# How long a web worker waits for the inference server to come up before reporting the model as failed
+connect_timeout = float(os.getenv("INFERENCE_CONNECT_TIMEOUT", 300))
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("inference server closed the connection")
+        data += chunk
+    return data
+
+
+class InferenceClient:
+    """One connection to the inference server, shared by every thread and coroutine in the process.
+
+    `submit` writes a request and returns a Future; a reader thread resolves the
+    Futures as responses arrive, in whatever order the server finishes them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._sock = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # A forked worker must not share the parent's connection (gunicorn preload_app)
+        os.register_at_fork(after_in_child=self._forget_connection)
+
+    def _forget_connection(self):
+        self._sock = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model, text):
+        payload = text.encode("utf-8")
+        future = Future()
+        with self._lock:
+            if self._sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.path)
+                except OSError:
+                    sock.close()
+                    raise
+                self._sock = sock
+                threading.Thread(target=self._read, args=(sock,), name="inference-client", daemon=True).start()
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self._pending[request_id] = future
+            try:
+                self._sock.sendall(REQUEST.pack(request_id, model, len(payload)) + payload)
+            except OSError:
+                # The reader sees the broken connection and fails everything still pending, this one included
+                self._sock.shutdown(socket.SHUT_RDWR)
+        return future
+
+    def _read(self, sock):
+        try:
+            while True:
+                request_id, status, length = RESPONSE.unpack(_recv_exactly(sock, RESPONSE.size))
+                payload = _recv_exactly(sock, length)
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if status == OK:
+                    future.set_result(torch.frombuffer(payload, dtype=torch.float32) if payload else None)
+                else:
+                    future.set_exception(RuntimeError(f"inference server: {payload.decode('utf-8')}"))
+        except OSError as exc:
+            with self._lock:
+                pending = {}
+                if self._sock is sock:
+                    self._sock, pending, self._pending = None, self._pending, {}
+            sock.close()
+            for future in pending.values():
+                future.set_exception(ConnectionError(f"lost connection to the inference server: {exc}"))
+
+
+class RemoteModel(ModelHandle):
+    """A ModelHandle whose model runs in inference_server.py.
+
+    "Loading" waits until the server answers, and the handle is its own `batcher`,
+    so `bert.batcher.predict_label(text)` and friends work unchanged.
+    """
+
+    def __init__(self, name, client):
+        super().__init__(name, model_path=None)
+        self.client = client
+
+    def _load(self):
+        start = time.perf_counter()
+        deadline = start + connect_timeout
+        while True:
+            try:
+                self.client.submit(PING, "").result(timeout=connect_timeout)
+                break
+            except (OSError, ConnectionError):
+                if time.perf_counter() > deadline:
+                    raise
+                time.sleep(0.5)
+        self._batcher = self
+        self.load_seconds = time.perf_counter() - start
+        print(f"{self.name} model served by the inference server at {self.client.path}")
+
+    def submit(self, text):
+        start = time.perf_counter()
+        future = self.client.submit(MODELS[self.name], text)
+        future.add_done_callback(lambda _: metrics.inference_seconds.observe(time.perf_counter() - start, model=self.name))
+        return future
+
+    def predict(self, text):
+        return self.submit(text).result()
+
+    def predict_label(self, text):
+        return torch.argmax(self.predict(text), dim=-1).item()
+
+    async def apredict(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    async def apredict_label(self, text):
+        return torch.argmax(await self.apredict(text), dim=-1).item()
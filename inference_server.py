@@ -0,0 +1,78 @@
+"""Runs the distortion and sentiment models in one process for every web worker on the machine.
+
+The web workers then do no BERT work themselves: start this first, then point
+them at its socket (see inference_client.py for the protocol). Requests from all
+workers share the same InferenceBatcher, so they are batched together.
+INFERENCE_THREADS sets torch's intra-op thread count for this process.
+
+    INFERENCE_THREADS=4 python inference_server.py --socket /tmp/mindmend-inference.sock
+    INFERENCE_SERVER_SOCKET=/tmp/mindmend-inference.sock gunicorn -c gunicorn.conf.py server:app
+"""
+import argparse
+import asyncio
+import os
+
+import torch
+
+# This process is the inference server, so utils must load the models itself. An empty
+# value also stops load_dotenv from taking the setting from .env.
+os.environ["INFERENCE_SERVER_SOCKET"] = ""
+
+from inference_client import ERROR, MODELS, OK, PING, REQUEST, RESPONSE  # noqa: E402
+from utils import bert, sentiment  # noqa: E402
+
+handles = {MODELS["bert"]: bert, MODELS["sentiment"]: sentiment}
+
+
+async def answer(writer, request_id, model, text):
+    try:
+        if model == PING:
+            payload = b""
+        else:
+            logits = await handles[model].batcher.apredict(text)
+            payload = logits.to(torch.float32).contiguous().numpy().tobytes()
+        status = OK
+    except KeyError:
+        status, payload = ERROR, f"unknown model {model}".encode("utf-8")
+    except Exception as exc:
+        status, payload = ERROR, str(exc).encode("utf-8")
+    # One write per response, so responses of concurrent requests never interleave
+    if not writer.is_closing():
+        writer.write(RESPONSE.pack(request_id, status, len(payload)) + payload)
+
+
+async def serve_connection(reader, writer):
+    tasks = set()
+    try:
+        while True:
+            request_id, model, length = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+            text = (await reader.readexactly(length)).decode("utf-8")
+            task = asyncio.create_task(answer(writer, request_id, model, text))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # the worker went away
+    finally:
+        writer.close()
+
+
+async def main(args):
+    torch.set_num_threads(args.threads)
+    bert.load()
+    sentiment.load()
+    await bert.await_ready()
+    await sentiment.await_ready()
+    # Only listen once the models are loaded, so a client's first successful ping means ready
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = await asyncio.start_unix_server(serve_connection, path=args.socket)
+    print(f"inference server listening on {args.socket} with {torch.get_num_threads()} torch threads")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default="/tmp/mindmend-inference.sock")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("INFERENCE_THREADS", os.cpu_count() or 1)))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""Rates clear-cut journal feedback from the keyword sets in utils.py, without the sentiment model.
+
+All keywords are compiled into one case-insensitive regex, so a feedback text is
+scanned once however many keywords there are. `rate` only answers when the
+feedback is unambiguous:
+- every keyword found belongs to one set;
+- there is no negation outside the keywords themselves ("not happy", "wasn't
+  confident", "average, not sure it helped");
+- there is no contrast ("..., but", "although");
+- the feedback is short enough for a keyword to carry it.
+
+Otherwise it returns None and the sentiment model decides.
+"""
+import os
+import re
+
+import metrics
+from utils import negative_keywords, neutral_keywords, positive_keywords, senti_mapping
+
+# KEYWORD_RATING=false always asks the sentiment model
+keyword_rating = os.getenv("KEYWORD_RATING", "true").lower() == "true"
+# Longer feedback is left to the model: one keyword says little about a long entry
+max_words = int(os.getenv("KEYWORD_RATING_MAX_WORDS", 40))
+
+# Rating for feedback whose keywords all come from one set. Two or more distinct
+# positive keywords ("confident and proud") count as Excellent.
+RATINGS = {
+    "negative": senti_mapping["Poor"],
+    "neutral": senti_mapping["Good"],
+    "positive": senti_mapping["Very Good"],
+}
+STRONGLY_POSITIVE = senti_mapping["Excellent"]
+
+def _alternation(words):
+    # Longest first, so "not bad" wins over any keyword it contains
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+_KEYWORDS = re.compile(
+    rf"\b(?:(?P<negative>{_alternation(negative_keywords)})"
+    rf"|(?P<neutral>{_alternation(neutral_keywords)})"
+    rf"|(?P<positive>{_alternation(positive_keywords)}))\b",
+    re.IGNORECASE,
+)
+_NEGATION = re.compile(r"\b(?:not|no|never|nothing|hardly|barely|without)\b|n't\b", re.IGNORECASE)
+_CONTRAST = re.compile(r"\b(?:but|although|though|however|yet|except)\b", re.IGNORECASE)
+
+
+def classify(feedback):
+    """("keywords", rating) when the feedback is clear-cut, otherwise (reason, None)."""
+    if len(feedback.split()) > max_words:
+        return "too_long", None
+    matches = list(_KEYWORDS.finditer(feedback))
+    if not matches:
+        return "no_keyword", None
+    sets = {match.lastgroup for match in matches}
+    if len(sets) > 1:
+        return "mixed", None
+    if _CONTRAST.search(feedback):
+        return "contrast", None
+    # "not bad" is a keyword itself, so only look for negations around the keywords
+    if _NEGATION.search(_KEYWORDS.sub(" ", feedback)):
+        return "negated", None
+    (kind,) = sets
+    if kind == "positive" and len({match.group().lower() for match in matches}) > 1:
+        return "keywords", STRONGLY_POSITIVE
+    return "keywords", RATINGS[kind]
+
+
+def rate(feedback):
+    """The senti_mapping rating for clear-cut feedback, or None to fall back to the sentiment model."""
+    if not keyword_rating:
+        return None
+    reason, rating = classify(feedback)
+    metrics.feedback_ratings.inc(source="keywords" if rating is not None else "model", reason=reason)
+    return rating
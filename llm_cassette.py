@@ -0,0 +1,215 @@
+"""Record/replay of LLM calls, so graph benchmarks can run offline and reproducibly.
+
+LLM_CASSETTE_MODE=record wraps every ChatGroq client from llm_clients.get_llm and
+appends each prompt, its response, the model and the observed latency to
+LLM_CASSETTE_PATH (gzipped JSON lines). LLM_CASSETTE_MODE=replay never touches
+the network: each prompt gets its recorded response back, and a prompt that was
+never recorded raises CassetteMiss. A prompt recorded several times replays its
+responses in recording order. With LLM_CASSETTE_LATENCY=true, replay sleeps for
+the recorded latency, so timings stay realistic.
+
+    LLM_CASSETTE_MODE=record python test.py
+    LLM_CASSETTE_MODE=replay LLM_CASSETTE_LATENCY=true python bench_graph.py
+"""
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+# off, record or replay
+mode = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+path = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl.gz")
+# Replay at recorded speed instead of instantly
+simulate_latency = os.getenv("LLM_CASSETTE_LATENCY", "false").lower() == "true"
+
+
+# Prompts embed message reprs whose ids are fresh UUIDs on every run
+_uuid = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+class CassetteMiss(KeyError):
+    """Replay was asked for a prompt that is not on the cassette."""
+
+
+def _key(model, params, messages):
+    prompt = [(message.type, _uuid.sub("<id>", str(message.content))) for message in messages]
+    return hashlib.sha256(json.dumps([model, params, prompt], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _read(path):
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                entries.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            # The recording process was killed before it could close the file; keep what was flushed
+            pass
+    return entries
+
+
+class Cassette:
+    """The entries of one cassette file, indexed by prompt key."""
+
+    def __init__(self, path, recording):
+        self.path = path
+        self.recording = recording
+        self._entries = {}
+        self._replayed = {}
+        self._lock = threading.Lock()
+        self._file = None
+        existing = _read(path)
+        for entry in existing:
+            self._entries.setdefault(entry["key"], []).append(entry)
+        if recording:
+            # Rewrite rather than append: a truncated gzip member can't be followed by another one
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+            for entry in existing:
+                self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            atexit.register(self.close)
+
+    def record(self, key, model, messages, chunks, latency, first_chunk=None):
+        entry = {
+            "key": key,
+            "model": model,
+            "prompt": [[message.type, message.content] for message in messages],
+            "chunks": chunks,
+            "latency": round(latency, 4),
+            "first_chunk": round(first_chunk, 4) if first_chunk is not None else None,
+        }
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self._file.write(json.dumps(entry) + "\n")
+            # A sync flush keeps the shared compression window but makes every entry readable after a kill
+            self._file.flush()
+
+    def replay(self, key, model):
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"no recorded response from {model} for this prompt in {self.path} (key {key[:12]})")
+            n = self._replayed.get(key, 0)
+            self._replayed[key] = n + 1
+            return entries[n % len(entries)]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _delays(entry):
+    """Seconds to wait before each replayed chunk, spreading the recorded latency over the stream."""
+    chunks = entry["chunks"]
+    if not simulate_latency or not chunks:
+        return [0.0] * len(chunks)
+    first = entry["first_chunk"] if entry["first_chunk"] is not None else entry["latency"]
+    rest = max(entry["latency"] - first, 0.0) / max(len(chunks) - 1, 1)
+    return [first] + [rest] * (len(chunks) - 1)
+
+
+class CassetteChatModel(BaseChatModel):
+    """Records the wrapped model's responses (record mode) or plays them back (replay mode, `inner` is None).
+
+    It is a chat model itself, so callbacks and LangGraph's token streaming work the same either way.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, protected_namespaces=())
+
+    model_name: str
+    params: dict = {}
+    inner: Optional[BaseChatModel] = None
+    cassette: Any = None
+
+    @property
+    def _llm_type(self):
+        return "cassette"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = _key(self.model_name, self.params, messages)
+        if self.inner is None:
+            entry = self.cassette.replay(key, self.model_name)
+            time.sleep(sum(_delays(entry)))
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(entry["chunks"])))])
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.cassette.record(key, self.model_name, messages, [result.generations[0].message.content], time.perf_counter() - start)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = _key(self.model_name, self.params, messages)
+        if self.inner is None:
+            entry = self.cassette.replay(key, self.model_name)
+            await asyncio.sleep(sum(_delays(entry)))
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(entry["chunks"])))])
+        start = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.cassette.record(key, self.model_name, messages, [result.generations[0].message.content], time.perf_counter() - start)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = _key(self.model_name, self.params, messages)
+        if self.inner is None:
+            entry = self.cassette.replay(key, self.model_name)
+            for chunk, delay in zip(entry["chunks"], _delays(entry)):
+                time.sleep(delay)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            return
+        start = time.perf_counter()
+        chunks, first = [], None
+        for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+            if first is None:
+                first = time.perf_counter() - start
+            chunks.append(chunk.message.content)
+            yield chunk
+        self.cassette.record(key, self.model_name, messages, chunks, time.perf_counter() - start, first)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = _key(self.model_name, self.params, messages)
+        if self.inner is None:
+            entry = self.cassette.replay(key, self.model_name)
+            for chunk, delay in zip(entry["chunks"], _delays(entry)):
+                await asyncio.sleep(delay)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            return
+        start = time.perf_counter()
+        chunks, first = [], None
+        async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+            if first is None:
+                first = time.perf_counter() - start
+            chunks.append(chunk.message.content)
+            yield chunk
+        self.cassette.record(key, self.model_name, messages, chunks, time.perf_counter() - start, first)
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def wrap(model, params, make_client):
+    """The chat model get_llm should use: `make_client()` as is, or wrapped for LLM_CASSETTE_MODE."""
+    global _cassette
+    if mode == "off":
+        return make_client()
+    if mode not in ("record", "replay"):
+        raise ValueError(f"LLM_CASSETTE_MODE must be off, record or replay, not {mode!r}")
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(path, recording=mode == "record")
+    inner = make_client() if mode == "record" else None
+    return CassetteChatModel(model_name=model, params=params, inner=inner, cassette=_cassette)
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+from dotenv import load_dotenv, find_dotenv
+from langchain_groq import ChatGroq
+
+import llm_cassette
+import metrics
+
+load_dotenv(find_dotenv())
+
+# One HTTP connection pool for every Groq call in the process, so TCP/TLS sessions are reused
+max_connections = int(os.getenv("GROQ_MAX_CONNECTIONS", 32))
+max_keepalive_connections = int(os.getenv("GROQ_MAX_KEEPALIVE", 16))
+keepalive_expiry = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", 60))
+request_timeout = float(os.getenv("GROQ_TIMEOUT", 60))
+# Upper bound on LLM calls in flight at once across all nodes
+max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+
+_limits = httpx.Limits(
+    max_connections=max_connections,
+    max_keepalive_connections=max_keepalive_connections,
+    keepalive_expiry=keepalive_expiry,
+)
+http_client = httpx.Client(limits=_limits, timeout=request_timeout)
+# Used by ainvoke/astream (async_server.py); connections bind to the serving event loop
+async_http_client = httpx.AsyncClient(limits=_limits, timeout=request_timeout)
+
+_clients = {}
+_clients_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max_concurrency)
+# Coroutines wait for a slot without blocking the event loop. A process serves either
+# the threaded or the asyncio server, so each side has its own bound.
+_async_slots = asyncio.Semaphore(max_concurrency)
+
+# Calls currently waiting for a slot / holding one
+_counts = {"waiting": 0, "in_flight": 0}
+_counts_lock = threading.Lock()
+
+
+def _adjust(waiting=0, in_flight=0):
+    with _counts_lock:
+        _counts["waiting"] += waiting
+        _counts["in_flight"] += in_flight
+
+
+@contextmanager
+def _slot():
+    _adjust(waiting=1)
+    with _slots:
+        _adjust(waiting=-1, in_flight=1)
+        try:
+            yield
+        finally:
+            _adjust(in_flight=-1)
+
+
+@asynccontextmanager
+async def _async_slot():
+    _adjust(waiting=1)
+    async with _async_slots:
+        _adjust(waiting=-1, in_flight=1)
+        try:
+            yield
+        finally:
+            _adjust(in_flight=-1)
+
+
+metrics.Gauge("llm_calls_waiting", "LLM calls waiting for a concurrency slot.", function=lambda: _counts["waiting"])
+metrics.Gauge("llm_calls_in_flight", "LLM calls holding a concurrency slot.", function=lambda: _counts["in_flight"])
+
+
+def llm_status():
+    with _counts_lock:
+        return {**_counts, "max_concurrency": max_concurrency}
+
+
+@contextmanager
+def _observed(model, method):
+    try:
+        with metrics.llm_seconds.time(model=model, method=method):
+            yield
+    except Exception:
+        metrics.llm_errors.inc(model=model, method=method)
+        raise
+
+
+class SharedLLM:
+    """A process-wide ChatGroq client that holds one of the global concurrency slots per call."""
+
+    def __init__(self, client):
+        self.client = client
+        self.model_name = client.model_name
+
+    def invoke(self, input, config=None, **kwargs):
+        with _observed(self.model_name, "invoke"), _slot():
+            return self.client.invoke(input, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        with _observed(self.model_name, "stream"), _slot():
+            yield from self.client.stream(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        with _observed(self.model_name, "invoke"):
+            async with _async_slot():
+                return await self.client.ainvoke(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        with _observed(self.model_name, "stream"):
+            async with _async_slot():
+                async for chunk in self.client.astream(input, config, **kwargs):
+                    yield chunk
+
+
+def get_llm(model, **params):
+    """Return the shared client for `model` with these parameters, creating it on first use."""
+    key = (model, tuple(sorted(params.items())))
+    with _clients_lock:
+        if key not in _clients:
+            # LLM_CASSETTE_MODE=record/replay swaps in llm_cassette's recording or replaying model
+            client = llm_cassette.wrap(model, params, lambda: ChatGroq(
+                api_key=os.getenv("GROQ_API_KEY"), model=model, http_client=http_client,
+                http_async_client=async_http_client, **params))
+            _clients[key] = SharedLLM(client)
+        return _clients[key]
@@ -0,0 +1,315 @@
+"""End-to-end load test: N simulated users through signup, login, chat and task feedback.
+
+Starts a fake Groq (stub_groq.py, with --llm-latency-ms per call) and the server
+as a subprocess whose MongoClient is replaced by the in-memory stand-in in
+mongo_standin.py (pip install mongomock), so neither an API key nor a database
+is needed. BERT runs for real, from the models in .env. Each user signs up, logs
+in, lists its conversations, connects over Socket.IO, sends --messages chat
+messages, waits for a task, submits feedback on it and waits for the
+feedback_processed result. Throughput and p50/p95/p99 latency are reported per
+HTTP endpoint and per Socket.IO event, and written to --output as JSON so two
+commits can be compared:
+
+    python loadtest.py --users 50 --messages 5 --output before.json
+    python loadtest.py --users 50 --messages 5 --output after.json
+    python loadtest.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import math
+import os
+import runpy
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import aiohttp
+import socketio
+
+from bench_startup import wait_for
+from stub_groq import StubGroqServer
+
+MESSAGES = [
+    "I keep thinking everyone at work thinks I'm useless",
+    "I failed one exam so I'll never get a good job",
+    "My friend didn't text back, she must hate me now",
+    "If I'm not perfect at this presentation it's a total disaster",
+    "I always ruin everything I touch",
+    "Nothing good ever happens to me",
+]
+
+
+class Recorder:
+    """Latency samples and error counts keyed by operation name ("POST /api/login", "receive_message", ...)."""
+
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+        self.errors = collections.Counter()
+
+    def add(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    def fail(self, name):
+        self.errors[name] += 1
+
+    def summary(self, elapsed):
+        result = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples[name])
+            result[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "per_second": len(values) / elapsed,
+                "mean_ms": statistics.mean(values) * 1000 if values else None,
+                "p50_ms": percentile(values, 0.50),
+                "p95_ms": percentile(values, 0.95),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": values[-1] * 1000 if values else None,
+            }
+        return result
+
+
+def percentile(values, q):
+    # Nearest-rank, like scheduler.py
+    return values[math.ceil(len(values) * q) - 1] * 1000 if values else None
+
+
+async def request(http, recorder, method, base_url, path, name=None, **kwargs):
+    """Issue one HTTP request and record it under `name` (default: the method and path)."""
+    name = name or f"{method} {path}"
+    start = time.perf_counter()
+    try:
+        async with http.request(method, base_url + path, **kwargs) as response:
+            body = await response.json(content_type=None)
+            status = response.status
+    except Exception:
+        recorder.fail(name)
+        raise
+    recorder.add(name, time.perf_counter() - start)
+    return status, body
+
+
+async def user_session(http, base_url, run_id, n, args, recorder):
+    email = f"load-{run_id}-{n}@example.com"
+    credentials = {"email": email, "password": "load-password"}
+    status, _ = await request(http, recorder, "POST", base_url, "/api/signup", json={"name": f"Load {n}", **credentials})
+    if status != 201:
+        recorder.fail("POST /api/signup")
+        return
+    status, body = await request(http, recorder, "POST", base_url, "/api/login", json=credentials)
+    if status != 200:
+        recorder.fail("POST /api/login")
+        return
+    headers = {"Authorization": f"Bearer {body['token']}"}
+    await request(http, recorder, "GET", base_url, "/api/conversations", headers=headers)
+
+    client = socketio.AsyncClient()
+    events = collections.defaultdict(asyncio.Queue)
+    for event in ("receive_message_chunk", "receive_message", "task_assigned", "server_busy", "feedback_processed"):
+        client.on(event, events[event].put)
+    start = time.perf_counter()
+    await client.connect(base_url, auth={"token": body["token"]}, transports=["websocket"], wait_timeout=args.timeout)
+    recorder.add("connect", time.perf_counter() - start)
+    last_sent = time.perf_counter()
+    try:
+        for turn in range(args.messages):
+            message = {
+                "content": MESSAGES[(n + turn) % len(MESSAGES)],
+                "timestamp": datetime.datetime.now().isoformat(),
+                "type": "text",
+            }
+            start = last_sent = time.perf_counter()
+            await client.emit("send_message", {"userMessage": message})
+            reply = asyncio.ensure_future(events["receive_message"].get())
+            busy = asyncio.ensure_future(events["server_busy"].get())
+            try:
+                # Time to the first streamed token; the full reply can't arrive before it
+                await asyncio.wait_for(events["receive_message_chunk"].get(), args.timeout)
+                recorder.add("receive_message_chunk (first)", time.perf_counter() - start)
+                done, _ = await asyncio.wait({reply, busy}, timeout=args.timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for future in (reply, busy):
+                    future.cancel()
+            if reply in done:
+                recorder.add("receive_message", time.perf_counter() - start)
+            else:
+                recorder.fail("server_busy" if busy in done else "receive_message")
+            # Drop leftover chunks of this reply before timing the next one
+            while not events["receive_message_chunk"].empty():
+                events["receive_message_chunk"].get_nowait()
+            if args.think_time:
+                await asyncio.sleep(args.think_time)
+
+        try:
+            # Tasks are generated after the reply, so time them from the last message sent
+            assigned = await asyncio.wait_for(events["task_assigned"].get(), args.task_timeout)
+            recorder.add("task_assigned", time.perf_counter() - last_sent)
+            task_id = assigned["task"]["_id"]
+        except asyncio.TimeoutError:
+            # No distortion-heavy enough conversation yet, or the task was created before we listened
+            status, body = await request(http, recorder, "GET", base_url, "/api/singleTask", headers=headers)
+            task_id = body["task"]["_id"] if status == 200 else None
+        if task_id is None:
+            recorder.fail("no task")
+            return
+        start = time.perf_counter()
+        status, body = await request(http, recorder, "POST", base_url, f"/api/feedback/{task_id}", name="POST /api/feedback/<taskId>",
+                                     headers=headers, json={"feedback": "I wrote down three thoughts and it helped a bit."})
+        if status != 202:
+            recorder.fail("POST /api/feedback/<taskId>")
+            return
+        try:
+            result = await asyncio.wait_for(events["feedback_processed"].get(), args.task_timeout)
+        except asyncio.TimeoutError:
+            # The status endpoint is the fallback for clients that missed the event
+            _, result = await request(http, recorder, "GET", base_url, body["statusUrl"], name="GET /api/feedback/jobs/<jobId>", headers=headers)
+        if result.get("status") == "done":
+            recorder.add("feedback_processed", time.perf_counter() - start)
+        else:
+            recorder.fail("feedback_processed")
+    finally:
+        await client.disconnect()
+
+
+async def run(args, base_url):
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+
+    async def ramped(http, n):
+        await asyncio.sleep(args.ramp * n / max(args.users, 1))
+        try:
+            await user_session(http, base_url, run_id, n, args, recorder)
+        except Exception as e:
+            recorder.fail("session")
+            print(f"user {n} failed: {e!r}")
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(ramped(http, n) for n in range(args.users)))
+        elapsed = time.perf_counter() - start
+        async with http.get(f"{base_url}/api/queue") as response:
+            queue = await response.json() if response.status == 200 else None
+    return recorder.summary(elapsed), elapsed, queue
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'operation':>32} {'count':>6} {'errors':>6} {'per s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in results.items():
+        cells = [f"{stats[key]:>8.0f}" if stats[key] is not None else f"{'-':>8}" for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"{name:>32} {stats['count']:>6} {stats['errors']:>6} {stats['per_second']:>7.2f} {' '.join(cells)}")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old_path} ({old.get('commit')}) -> {new_path} ({new.get('commit')})")
+    print(f"{'operation':>32} {'':>4} {'old ms':>8} {'new ms':>8} {'change':>8}")
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        before, after = old["results"].get(name, {}), new["results"].get(name, {})
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            a, b = before.get(key), after.get(key)
+            change = f"{(b - a) / a * 100:>+7.1f}%" if a and b is not None else f"{'-':>8}"
+            a = f"{a:>8.0f}" if a is not None else f"{'-':>8}"
+            b = f"{b:>8.0f}" if b is not None else f"{'-':>8}"
+            print(f"{name:>32} {key[:3]:>4} {a} {b} {change}")
+        errors = (before.get("errors", 0), after.get("errors", 0))
+        if any(errors):
+            print(f"{name:>32} {'err':>4} {errors[0]:>8} {errors[1]:>8}")
+
+
+def log_tail(log, lines=20):
+    if log is None:
+        return ""
+    log.seek(0)
+    return "\n".join(log.read().decode("utf-8", errors="replace").splitlines()[-lines:])
+
+
+def main(args):
+    stub = StubGroqServer(latency_ms=args.llm_latency_ms, token_delay_ms=args.llm_token_delay_ms,
+                          classifier_reply="distortion").start()
+    env = dict(os.environ, PORT=str(args.port), USE_RELOADER="false", GROQ_API_BASE=stub.url, GROQ_API_KEY="loadtest")
+    # The server's stderr goes to a file (a pipe nobody reads could fill up and block it),
+    # so a crash at startup can be reported with its traceback
+    server_log = None if args.server_output else tempfile.TemporaryFile()
+    process = subprocess.Popen([sys.executable, __file__, "--serve", args.server], env=env,
+                               stdout=None if args.server_output else subprocess.DEVNULL,
+                               stderr=server_log, start_new_session=True)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        try:
+            wait_for(f"{base_url}/api/ready", time.perf_counter() + args.startup_timeout, process)
+        except RuntimeError as exc:
+            sys.exit(f"{args.server}: {exc}\n{log_tail(server_log)}")
+        results, elapsed, queue = asyncio.run(run(args, base_url))
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass  # the server already exited
+        process.wait()
+        stub.shutdown()
+        if server_log:
+            server_log.close()
+
+    print(f"{args.server}: {args.users} users x {args.messages} messages in {elapsed:.1f}s, "
+          f"fake Groq {args.llm_latency_ms:g}ms + {args.llm_token_delay_ms:g}ms/token")
+    print_results(results)
+    output = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "serve", "output")},
+        "elapsed_s": elapsed,
+        "results": results,
+        "server_queue": queue,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="server.py", help="server.py or async_server.py")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=5, help="chat messages per user")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=0, help="seconds between a reply and the next message")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="fake Groq latency per call")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=120, help="per-reply timeout in seconds")
+    parser.add_argument("--task-timeout", type=float, default=10, help="how long to wait for task_assigned")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--server-output", action="store_true", help="show the server's stdout/stderr")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two --output files and exit")
+    parser.add_argument("--serve", metavar="SCRIPT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.serve:
+        # Server subprocess: swap in the in-memory Mongo before anything imports db
+        import mongo_standin
+
+        mongo_standin.install()
+        sys.argv = [args.serve]
+        runpy.run_path(args.serve, run_name="__main__")
+    else:
+        main(args)
@@ -0,0 +1,196 @@
+"""Process-wide latency histograms, counters and gauges, rendered in the Prometheus text format.
+
+Both servers expose `render()` on GET /metrics. Metrics are defined here so every
+module records into the same registry; gauges whose value lives elsewhere (queue
+depths, in-flight counts) can be given a `function` that is read at scrape time.
+"""
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a Mongo point read (~1ms) up to a slow LLM reply
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. With `function`, the value is read from it at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.function is not None:
+            return [(self.name, (), (), self.function())]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+                samples.append((f"{self.name}_sum", key, (), total))
+                samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+
+def timed(histogram, in_progress=None, **labels):
+    """Decorator recording each call's duration in `histogram` (and a running count in the
+    `in_progress` gauge). Works on plain functions and coroutine functions."""
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if in_progress is not None:
+                    in_progress.inc(**labels)
+                try:
+                    with histogram.time(**labels):
+                        return await fn(*args, **kwargs)
+                finally:
+                    if in_progress is not None:
+                        in_progress.dec(**labels)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if in_progress is not None:
+                in_progress.inc(**labels)
+            try:
+                with histogram.time(**labels):
+                    return fn(*args, **kwargs)
+            finally:
+                if in_progress is not None:
+                    in_progress.dec(**labels)
+        return wrapper
+
+    return decorate
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+node_seconds = Histogram("graph_node_seconds", "Wall time of each LangGraph node.", ["node"])
+nodes_in_progress = Gauge("graph_nodes_in_progress", "LangGraph nodes currently running.", ["node"])
+llm_seconds = Histogram("llm_request_seconds", "Groq call duration, including waiting for a concurrency slot.", ["model", "method"])
+llm_errors = Counter("llm_errors_total", "Groq calls that raised.", ["model", "method"])
+first_token_seconds = Histogram("chat_first_token_seconds", "From the start of a chat turn to its first reply token.")
+bert_tokenize_seconds = Histogram("bert_tokenize_seconds", "Tokenizing one BERT batch.", ["model"])
+bert_seconds = Histogram("bert_forward_seconds", "One batched BERT forward pass (tokenization excluded).", ["model"])
+bert_batch_size = Histogram("bert_batch_size", "Texts per BERT forward pass.", ["model"], buckets=(1, 2, 4, 8, 16, 32, 64))
+bert_pending = Gauge("bert_pending_requests", "Distinct texts queued or in the running batch.", ["model"])
+prediction_cache_lookups = Counter("prediction_cache_lookups_total", "Prediction cache lookups by result (hit or miss).", ["model", "result"])
+prediction_cache_evictions = Counter("prediction_cache_evictions_total", "Least recently used predictions dropped from a full cache.", ["model"])
+prediction_cache_entries = Gauge("prediction_cache_entries", "Predictions currently cached.", ["model"])
+inference_seconds = Histogram("inference_server_request_seconds", "Round trip of one prediction to inference_server.py.", ["model"])
+feedback_ratings = Counter("feedback_ratings_total", "Journal feedback ratings by source (keywords or model) and why.", ["source", "reason"])
+mongo_seconds = Histogram("mongo_command_seconds", "MongoDB command round trip.", ["command", "collection"])
+mongo_errors = Counter("mongo_command_errors_total", "MongoDB commands that failed.", ["command", "collection"])
+password_in_flight = Gauge("password_operations_in_flight", "bcrypt hashes/checks queued or running.")
@@ -0,0 +1,112 @@
+"""Split the old single-array conversation documents into conversation buckets.
+
+For every document in `conversations` that still has a `conversation` array, the
+messages are read in bucket-sized slices (using a $slice projection, so a
+multi-MB array is never loaded at once), written to `conversation_buckets` in
+batches, and the array is then removed from the original document. If a user
+already chatted after the switch to buckets, the old messages are numbered
+before their existing buckets (at negative seqs when those start at 0) so
+history stays in order. Documents whose array
+was already removed are not matched again, so the migration can be re-run. Each
+bucket records the document it came from in `migrated_from`; a run interrupted
+between writing buckets and removing the array leaves the array in place, and
+the re-run deletes those buckets before writing them again instead of
+duplicating the history. After each user is migrated, their whole history is
+paged through the same cursors GET /api/conversations hands out, to check that
+every message can be reached.
+
+    python migrate_conversations.py --dry-run
+    python migrate_conversations.py --batch-buckets 20
+"""
+import argparse
+import sys
+
+from conversation_store import bucket_size, get_page, make_bucket, max_page_size, page_args
+from db import conversations_collection, conversation_buckets_collection
+from indexes import ensure_indexes
+
+
+def pending_conversations():
+    # Only user ids and array sizes, never the arrays themselves
+    return conversations_collection.aggregate([
+        {"$match": {"conversation": {"$type": "array"}}},
+        {"$project": {"user_id": 1, "size": {"$size": "$conversation"}}},
+    ], allowDiskUse=True)
+
+
+def migrate_user(doc, batch_buckets, dry_run):
+    user_id = doc["user_id"]
+    offsets = range(0, doc["size"], bucket_size)
+    if not dry_run:
+        # Left over from an interrupted run
+        conversation_buckets_collection.delete_many({"user_id": user_id, "migrated_from": doc["_id"]})
+    first_seq = 0
+    oldest = conversation_buckets_collection.find_one(
+        {"user_id": user_id, "migrated_from": {"$ne": doc["_id"]}}, {"seq": 1}, sort=[("seq", 1)]
+    )
+    if oldest:
+        first_seq = oldest["seq"] - len(offsets)
+
+    buckets = []
+    written = 0
+    for seq, offset in enumerate(offsets, start=first_seq):
+        chunk = conversations_collection.find_one(
+            {"_id": doc["_id"]}, {"conversation": {"$slice": [offset, bucket_size]}}
+        )["conversation"]
+        buckets.append({**make_bucket(user_id, seq, chunk), "migrated_from": doc["_id"]})
+        if len(buckets) >= batch_buckets:
+            written += flush(buckets, dry_run)
+            buckets = []
+    written += flush(buckets, dry_run)
+
+    if not dry_run:
+        conversations_collection.update_one({"_id": doc["_id"]}, {"$unset": {"conversation": ""}})
+    print(f"{user_id}: {doc['size']} messages -> {written} buckets")
+    return written
+
+
+def verify_user(user_id):
+    """Page through the user's whole history like a client would; returns whether every
+    stored message was reached."""
+    stored = sum(b["count"] for b in conversation_buckets_collection.find({"user_id": user_id}, {"count": 1}))
+    seen = 0
+    before = None
+    while True:
+        try:
+            # The cursors must also pass the servers' validation
+            before, limit = page_args(before, max_page_size)
+        except ValueError as exc:
+            print(f"{user_id}: paging stopped after {seen} of {stored} messages: {exc}")
+            return False
+        page, before = get_page(user_id, before, limit)
+        seen += len(page)
+        if before is None:
+            break
+    if seen != stored:
+        print(f"{user_id}: paging reached {seen} of {stored} messages")
+    return seen == stored
+
+
+def flush(buckets, dry_run):
+    if buckets and not dry_run:
+        conversation_buckets_collection.insert_many(buckets, ordered=True)
+    return len(buckets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-buckets", type=int, default=20, help="buckets per insert_many")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be written without changing anything")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    users = buckets = unreachable = 0
+    for doc in pending_conversations():
+        buckets += migrate_user(doc, args.batch_buckets, args.dry_run)
+        users += 1
+        if not args.dry_run and not verify_user(doc["user_id"]):
+            unreachable += 1
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {users} conversations into {buckets} buckets of up to {bucket_size} messages")
+    if unreachable:
+        print(f"{unreachable} conversations can't be paged through completely")
+        sys.exit(1)
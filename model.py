@@ -1,11 +1,17 @@
+import asyncio
+import threading
+import time
 import torch
 from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage
+from langchain_core.runnables import RunnableLambda
 from dotenv import load_dotenv, find_dotenv
 import os
 from typing import Literal
-from langchain_groq import ChatGroq
-from utils import State, bert_tokenizer, bert_model, label_map, memory, sentinment_tokenizer, sentiment_model, senti_mapping, negative_keywords, neutral_keywords, positive_keywords, device
+from llm_clients import get_llm
+import keyword_rating
+import metrics
+from utils import State, bert, label_map, memory, sentiment, senti_mapping, negative_keywords, neutral_keywords, positive_keywords
     
 # def should_continue(state: State) -> Literal["summarize_conversation", "detect_node"]:
 #     """Return the next node to execute."""
@@ -18,12 +24,30 @@ from utils import State, bert_tokenizer, bert_model, label_map, memory, sentinme
 
 load_dotenv(find_dotenv())
 
-llm = ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model="llama3-8b-8192", temperature=0.7)
+llm = get_llm("llama3-8b-8192", temperature=0.7)
 
-def summarize_history(state: State):
-    """Creates a brief summary of recent conversation turns for context."""
-    summary = state.get("summary", "")
+# Only summarize once the history grows past these limits. The newest messages are kept
+# verbatim for chat_agent and everything older is folded into the summary and pruned.
+summary_max_messages = int(os.getenv("SUMMARY_MAX_MESSAGES", 12))
+summary_max_tokens = int(os.getenv("SUMMARY_MAX_TOKENS", 1500))
+summary_keep_messages = int(os.getenv("SUMMARY_KEEP_MESSAGES", 6))
+
+def approx_tokens(messages):
+    """Rough token count (~4 characters per token), good enough for a threshold."""
+    return sum(len(str(m.content)) for m in messages) // 4
+
+def _summary_request(state: State):
+    """Returns (messages to fold in, summarizer input), or None while the history is still short."""
+    messages = state["messages"]
+    if len(messages) <= summary_max_messages and approx_tokens(messages) <= summary_max_tokens:
+        return None
+
+    # Messages still in the state have not been summarized yet, so only these are sent
+    old_messages = messages[:max(len(messages) - summary_keep_messages, 0)]
+    if not old_messages:
+        return None
 
+    summary = state.get("summary", "")
     if summary:
         summary_message = (
             f"This is a summary of the conversation to date: {summary}\n\n"
@@ -32,53 +56,151 @@ def summarize_history(state: State):
     else:
         summary_message = "Create a summary of the conversation above:"
 
-    # Add prompt to our history
-    messages = state["messages"] + [HumanMessage(content=summary_message)]
-    summarizer = ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model="mistral-saba-24b")    
-    response = summarizer.invoke(messages)
+    return old_messages, old_messages + [HumanMessage(content=summary_message)]
 
-    summary = response.content
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][-2:]]
-    
-    return {"summary": response.content}
+def _summary_update(old_messages, response):
+    # Prune the summarized messages from the checkpointed state
+    delete_messages = [RemoveMessage(id=m.id) for m in old_messages]
+    return {"summary": response.content, "messages": delete_messages}
 
-def classifier_node(state: State):
-    user_input = state["user_input"]
-    
-    prompt = (
+def summarize_history(state: State):
+    """Folds older conversation turns into the running summary once the history gets too long."""
+    request = _summary_request(state)
+    if request is None:
+        return {}
+    old_messages, summarizer_input = request
+    response = get_llm("mistral-saba-24b").invoke(summarizer_input)
+    return _summary_update(old_messages, response)
+
+async def asummarize_history(state: State):
+    request = _summary_request(state)
+    if request is None:
+        return {}
+    old_messages, summarizer_input = request
+    response = await get_llm("mistral-saba-24b").ainvoke(summarizer_input)
+    return _summary_update(old_messages, response)
+
+# CLASSIFIER_MODE=gate runs the local BERT first and only asks the LLM when BERT is unsure:
+# P(No Distortion) >= GATE_CHAT_THRESHOLD means chat, 1 - P(No Distortion) >= GATE_DISTORTION_THRESHOLD
+# means distortion, anything in between goes to the LLM classifier.
+classifier_mode = os.getenv("CLASSIFIER_MODE", "llm")
+gate_chat_threshold = float(os.getenv("GATE_CHAT_THRESHOLD", 0.9))
+gate_distortion_threshold = float(os.getenv("GATE_DISTORTION_THRESHOLD", 0.9))
+no_distortion_id = next(k for k, v in label_map.items() if v == "No Distortion")
+
+gate_stats = {"bert_chat": 0, "bert_distortion": 0, "llm": 0, "llm_seconds": 0.0, "bert_seconds": 0.0}
+_gate_stats_lock = threading.Lock()
+
+def _count(key, seconds_key=None, seconds=0.0):
+    with _gate_stats_lock:
+        gate_stats[key] += 1
+        if seconds_key:
+            gate_stats[seconds_key] += seconds
+
+def _gate_decision(logits, seconds):
+    probs = torch.softmax(logits, dim=-1)
+    p_none = probs[no_distortion_id].item()
+    with _gate_stats_lock:
+        gate_stats["bert_seconds"] += seconds
+    if p_none >= gate_chat_threshold:
+        _count("bert_chat")
+        return "chat"
+    if 1 - p_none >= gate_distortion_threshold:
+        _count("bert_distortion")
+        return "distortion"
+    return None
+
+def bert_gate(user_input):
+    """Returns 'chat' or 'distortion' when BERT is confident enough, otherwise None."""
+    start = time.perf_counter()
+    logits = bert.batcher.predict(user_input)
+    return _gate_decision(logits, time.perf_counter() - start)
+
+async def abert_gate(user_input):
+    start = time.perf_counter()
+    await bert.await_ready()
+    logits = await bert.batcher.apredict(user_input)
+    return _gate_decision(logits, time.perf_counter() - start)
+
+def _classify_prompt(user_input):
+    return (
         "You are an expert in cognitive behavioral therapy (CBT). Your task is to analyze the given message "
         "and determine if it contains a cognitive distortion. If it contains a distortion, respond with 'distortion'. "
         "If it is a general chat message, respond with 'chat'."
         "Only respond with 'distortion' or 'chat'.\n\n"
         f"Message: {user_input}\n"
     )
-    
-    classifier = ChatGroq(api_key=os.getenv("GROQ_API_KEY"), model="mistral-saba-24b", temperature=0.3, max_tokens=20) 
-    response = classifier.invoke(prompt).content.strip().lower()
+
+def llm_classify(user_input):
+    start = time.perf_counter()
+    classifier = get_llm("mistral-saba-24b", temperature=0.3, max_tokens=20)
+    response = classifier.invoke(_classify_prompt(user_input)).content.strip().lower()
+    _count("llm", "llm_seconds", time.perf_counter() - start)
+    return response
+
+async def allm_classify(user_input):
+    start = time.perf_counter()
+    classifier = get_llm("mistral-saba-24b", temperature=0.3, max_tokens=20)
+    response = (await classifier.ainvoke(_classify_prompt(user_input))).content.strip().lower()
+    _count("llm", "llm_seconds", time.perf_counter() - start)
+    return response
+
+def gate_report():
+    """Fraction of classifications answered locally and the LLM latency that saved."""
+    with _gate_stats_lock:
+        stats = dict(gate_stats)
+    avoided = stats["bert_chat"] + stats["bert_distortion"]
+    total = avoided + stats["llm"]
+    mean_llm = stats["llm_seconds"] / stats["llm"] if stats["llm"] else 0.0
+    return {
+        **stats,
+        "total": total,
+        "llm_calls_avoided": avoided / total if total else 0.0,
+        "mean_llm_seconds": mean_llm,
+        "seconds_saved": avoided * mean_llm - stats["bert_seconds"],
+    }
+
+def _classifier_update(state: State, response):
     print(response)
-    
-    if response != "distortion":
-        state["distortion"].append("No Distortion")
-        print(state["distortion"])
-        return {"needs_distortion_check": response == "distortion", "distortion": state["distortion"]}
-    
+    # Only chat_node writes `distortion`, so this can run in parallel with detect_node
     return {"needs_distortion_check": response == "distortion"}
 
+def classifier_node(state: State):
+    user_input = state["user_input"]
+    
+    response = bert_gate(user_input) if classifier_mode == "gate" else None
+    if response is None:
+        response = llm_classify(user_input)
+    return _classifier_update(state, response)
+
+async def aclassifier_node(state: State):
+    user_input = state["user_input"]
+
+    response = await abert_gate(user_input) if classifier_mode == "gate" else None
+    if response is None:
+        response = await allm_classify(user_input)
+    return _classifier_update(state, response)
+
 # Node functions
+def _detect_update(state: State, predicted_class):
+    new_distortion = label_map.get(predicted_class, None)
+    return {"detected_distortion": new_distortion}
+
+def _resolve_distortion(state: State):
+    """The distortion history including this turn: BERT's label if the classifier flagged the message."""
+    new_distortion = state.get("detected_distortion") if state.get("needs_distortion_check") else "No Distortion"
+    return state.get("distortion", []) + [new_distortion]
+
 def detect_cognitive_distortion(state: State):
     print("entered detect node")
-    distortion = state.get("distortion", [])
-    print(distortion)
-    inputs = bert_tokenizer(state["user_input"], return_tensors='pt', padding=True, truncation=True, max_length=512)
-    with torch.no_grad():
-        outputs = bert_model(**inputs)
-    predicted_class = torch.argmax(outputs.logits, dim=-1).item()
-    new_distortion = label_map.get(predicted_class, None)
-    distortion.append(new_distortion)
-    return {"distortion": distortion}
+    return _detect_update(state, bert.batcher.predict_label(state["user_input"]))
 
-def chat_agent(state: State):
-    print("entered chat node")
+async def adetect_cognitive_distortion(state: State):
+    print("entered detect node")
+    await bert.await_ready()
+    return _detect_update(state, await bert.batcher.apredict_label(state["user_input"]))
+
+def _chat_prompt(state: State):
     summary = state.get("summary", "")
     messages= state["messages"][-6:]
     distortion = state.get("distortion", [])
@@ -87,7 +209,7 @@ def chat_agent(state: State):
     
     print(messages)
     
-    prompt = (
+    return (
         f"You're 'MindMend', a CBT-informed chatbot helping users challenge negative thoughts.\n\n"
         f"Here’s the conversation summary so far: {summary}\n"
         f"User's previous history: {messages}\n"
@@ -121,10 +243,26 @@ def chat_agent(state: State):
     #         "Your tone should be warm, professional, and engaging. "
     #         "Ensure responses are under 75 words, blending supportive insights with meaningful dialogue."
     #     )
+
+def chat_agent(state: State):
+    print("entered chat node")
+    # Stream the reply so the server can forward tokens (graph stream_mode="messages")
+    # while the rest of the graph keeps running
+    distortion = _resolve_distortion(state)
+    response = None
+    for chunk in llm.stream(_chat_prompt({**state, "distortion": distortion})):
+        response = chunk if response is None else response + chunk
     
-    response = llm.invoke(prompt)
-    
-    return {"messages": [AIMessage(content=response.content)] }
+    return {"messages": [AIMessage(content=response.content if response else "")], "distortion": distortion}
+
+async def achat_agent(state: State):
+    print("entered chat node")
+    distortion = _resolve_distortion(state)
+    response = None
+    async for chunk in llm.astream(_chat_prompt({**state, "distortion": distortion})):
+        response = chunk if response is None else response + chunk
+
+    return {"messages": [AIMessage(content=response.content if response else "")], "distortion": distortion}
 
 def restructuring_agent(state: State):
     print("entered restructure node")
@@ -142,8 +280,8 @@ def restructuring_agent(state: State):
         return {"restruct": ""}
     
 
-def task_assignment_agent(state: State):
-    print("entered task node")
+def _task_prompt(state: State):
+    """The task-generation prompt, or None when no new task is due."""
     messages = state["messages"][-10:]
     distortions = state.get("distortion", [])
     if len(distortions) > 2:
@@ -152,7 +290,7 @@ def task_assignment_agent(state: State):
     user_messages = [msg.content for msg in messages if isinstance(msg, HumanMessage)]
     
     if state.get("task", "") == "" and sum(1 for dist in distortions if dist != "No Distortion") > 2: 
-        prompt = (
+        return (
             # f"Previous User Messages: {user_messages}\n"
             # f"Previously detected distortions: {distortions}\n\n"
             # "You're a CBT therapist. Based on the conversation, create a meaningful and engaging CBT task for the user. "
@@ -179,24 +317,28 @@ def task_assignment_agent(state: State):
             '"Task Goal": "The intended benefit of completing the task."\n'
             "}"   
         )
-        
-        response = llm.invoke(prompt)
-        return {"task": response.content}
-    else:
+    return None
+
+@metrics.timed(metrics.node_seconds, metrics.nodes_in_progress, node="task_node")
+def task_assignment_agent(state: State):
+    print("entered task node")
+    prompt = _task_prompt(state)
+    if prompt is None:
         return {"task": ""}
+    response = llm.invoke(prompt)
+    return {"task": response.content}
 
-def journal_report(feedback, task):
-    print("entered journal node")
-        # Step 2: *Model-based prediction if no keyword matches*
-    inputs = sentinment_tokenizer(feedback, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    inputs = {k: v.to(device) for k, v in inputs.items()}  # Move inputs to device
-
-    with torch.no_grad():
-        logits = sentiment_model(**inputs).logits
-        
-    prediction = torch.argmax(logits, dim=1).item()
-    
-    prompt = (
+@metrics.timed(metrics.node_seconds, metrics.nodes_in_progress, node="task_node")
+async def atask_assignment_agent(state: State):
+    print("entered task node")
+    prompt = _task_prompt(state)
+    if prompt is None:
+        return {"task": ""}
+    response = await llm.ainvoke(prompt)
+    return {"task": response.content}
+
+def _journal_prompt(feedback, task):
+    return (
         f"Task: {task}\n"
         f"Feedback: {feedback}\n"
         "You are a CBT therapist reviewing a user's journal entry. Provide constructive feedback on the user's reflections. "
@@ -204,29 +346,74 @@ def journal_report(feedback, task):
         "If the feedback is satisfactory, provide positive reinforcement. "
         "Ensure that the responses are under 150 words."
     )
+
+@metrics.timed(metrics.node_seconds, metrics.nodes_in_progress, node="journal_node")
+def journal_report(feedback, task):
+    print("entered journal node")
+    # Step 1: clear-cut feedback is rated from the keyword sets
+    prediction = keyword_rating.rate(feedback)
+    # Step 2: *Model-based prediction if no keyword matches*, running while the LLM writes the feedback
+    pending = sentiment.batcher.submit(feedback) if prediction is None else None
     
-    response = llm.invoke(prompt)
+    response = llm.invoke(_journal_prompt(feedback, task))
+    if pending is not None:
+        prediction = torch.argmax(pending.result(), dim=-1).item()
+    return {"ai_feedback": response.content, "rating": prediction}
+
+@metrics.timed(metrics.node_seconds, metrics.nodes_in_progress, node="journal_node")
+async def ajournal_report(feedback, task):
+    print("entered journal node")
+    prediction = keyword_rating.rate(feedback)
+    if prediction is not None:
+        response = await llm.ainvoke(_journal_prompt(feedback, task))
+        return {"ai_feedback": response.content, "rating": prediction}
+    await sentiment.await_ready()
+    # The rating and the written feedback don't depend on each other
+    prediction, response = await asyncio.gather(
+        sentiment.batcher.apredict_label(feedback),
+        llm.ainvoke(_journal_prompt(feedback, task)),
+    )
     return {"ai_feedback": response.content, "rating": prediction}
     
 
-# Create workflow and add nodes/edges
-workflow = StateGraph(state_schema=State)
-workflow.support_multiple_edges = True
-
-workflow.add_node("detect_node", detect_cognitive_distortion)
-workflow.add_node("summarize_conversation", summarize_history)
-workflow.add_node("classifier_node", classifier_node)
-workflow.add_node("chat_node", chat_agent)
-workflow.add_node("restructure_node", restructuring_agent)
-workflow.add_node("task_node", task_assignment_agent)
-
-workflow.add_edge(START, "summarize_conversation")
-workflow.add_edge("summarize_conversation", "classifier_node")
-workflow.add_conditional_edges("classifier_node", lambda x: x["needs_distortion_check"], path_map={True: "detect_node", False: "chat_node"})
-# workflow.add_conditional_edges("detect_node", lambda x: x["distortion"] != "No Distortion", path_map={True: "restructure_node", False: "chat_node"})
-workflow.add_edge("detect_node", "chat_node")
-workflow.add_edge("chat_node", "task_node")
-# workflow.add_edge("restructure_node", "chat_node")
-# workflow.add_edge("task_node", END)
-
-assistant = workflow.compile(checkpointer=memory)
\ No newline at end of file
+# GRAPH_MODE=parallel (default) runs the LLM classifier and a speculative BERT detection
+# concurrently and joins them at chat_node; the summary update runs after the reply. GRAPH_MODE=serial keeps the original one-node-at-a-time pipeline.
+graph_mode = os.getenv("GRAPH_MODE", "parallel")
+
+def _node(name, func, afunc=None):
+    """A graph node whose runs are timed into graph_node_seconds{node=name}."""
+    timer = metrics.timed(metrics.node_seconds, metrics.nodes_in_progress, node=name)
+    return RunnableLambda(timer(func), afunc=timer(afunc) if afunc else None)
+
+def build_workflow(mode=graph_mode):
+    workflow = StateGraph(state_schema=State)
+    workflow.support_multiple_edges = True
+
+    # Each node has a sync and an async implementation: assistant.invoke/stream (server.py)
+    # runs the first, assistant.ainvoke/astream (async_server.py) the second
+    workflow.add_node("detect_node", _node("detect_node", detect_cognitive_distortion, adetect_cognitive_distortion))
+    workflow.add_node("summarize_conversation", _node("summarize_conversation", summarize_history, asummarize_history))
+    workflow.add_node("classifier_node", _node("classifier_node", classifier_node, aclassifier_node))
+    workflow.add_node("chat_node", _node("chat_node", chat_agent, achat_agent))
+    workflow.add_node("restructure_node", _node("restructure_node", restructuring_agent))
+    # Task generation is not a node: the servers run task_assignment_agent as a background
+    # job once the reply has been sent
+
+    if mode == "serial":
+        workflow.add_edge(START, "summarize_conversation")
+        workflow.add_edge("summarize_conversation", "classifier_node")
+        workflow.add_conditional_edges("classifier_node", lambda x: x["needs_distortion_check"], path_map={True: "detect_node", False: "chat_node"})
+        # workflow.add_conditional_edges("detect_node", lambda x: x["distortion"] != "No Distortion", path_map={True: "restructure_node", False: "chat_node"})
+        workflow.add_edge("detect_node", "chat_node")
+        # workflow.add_edge("restructure_node", "chat_node")
+        return workflow
+
+    # chat_node waits for both branches; BERT's label is only used if the classifier asks for it
+    workflow.add_edge(START, "classifier_node")
+    workflow.add_edge(START, "detect_node")
+    workflow.add_edge(["classifier_node", "detect_node"], "chat_node")
+    # The summary only feeds the next turn's prompt, so it is folded in after the reply
+    workflow.add_edge("chat_node", "summarize_conversation")
+    return workflow
+
+assistant = build_workflow().compile(checkpointer=memory)
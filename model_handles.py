@@ -0,0 +1,52 @@
+"""The distortion and sentiment model handles, importable without the rest of utils.
+
+utils.py re-exports everything here. gunicorn.conf.py imports this module alone in
+the master to load the models before forking: that way no Mongo client or other
+background thread exists in the process being forked.
+"""
+import os
+
+import torch
+from dotenv import load_dotenv, find_dotenv
+
+from model_loader import ModelHandle
+
+# Load environment variables
+load_dotenv(find_dotenv())
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Batch concurrent requests into one padded forward pass per model
+batch_max_size = int(os.getenv("BATCH_MAX_SIZE", 16))
+batch_window_ms = float(os.getenv("BATCH_WINDOW_MS", 5))
+
+# Fine-tuned BERT models for cognitive distortion detection and journal sentiment.
+# They load on first use, or in the background once warm_up() is called.
+# INFERENCE_SERVER_SOCKET=<path> instead sends every prediction to inference_server.py
+# listening on that Unix socket, and this process loads no models at all.
+if os.getenv("INFERENCE_SERVER_SOCKET"):
+    from inference_client import InferenceClient, RemoteModel
+
+    inference_client = InferenceClient(os.getenv("INFERENCE_SERVER_SOCKET"))
+    bert = RemoteModel("bert", inference_client)
+    sentiment = RemoteModel("sentiment", inference_client)
+else:
+    bert = ModelHandle("bert", os.getenv("BERT_MODEL"), os.getenv("BERT_TOKENIZER"), device, batch_max_size, batch_window_ms)
+    sentiment = ModelHandle("sentiment", os.getenv("SENTIMENT_MODEL"), os.getenv("SENTIMENT_MODEL"), device, batch_max_size, batch_window_ms)
+
+
+def warm_up():
+    """Start loading both models concurrently without blocking the caller."""
+    for handle in (bert, sentiment):
+        handle.load()
+
+
+def model_status():
+    return {handle.name: handle.status() for handle in (bert, sentiment)}
+
+
+# MODEL_WARMUP=eager restores the old behaviour of loading everything at import
+if os.getenv("MODEL_WARMUP", "background") == "eager":
+    warm_up()
+    bert.wait()
+    sentiment.wait()
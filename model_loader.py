@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import prediction_cache
+from backends import load_backend
+from batcher import InferenceBatcher
+
+# One thread per model so the distortion and sentiment models load concurrently
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-loader")
+# transformers' lazy module attributes are not safe to resolve from two threads at once
+_import_lock = threading.Lock()
+# Rust-backed tokenizers; FAST_TOKENIZER=false goes back to the pure-Python BertTokenizer
+fast_tokenizer = os.getenv("FAST_TOKENIZER", "true").lower() == "true"
+# float32 (default), bfloat16 or float16 weights for CPU inference with the torch backend
+model_dtype = os.getenv("MODEL_DTYPE", "float32").lower()
+# Point the weights at a read-only mapping of the safetensors file instead of private copies,
+# so every process using the same file shares one set of physical pages (the page cache)
+mmap_weights = os.getenv("MMAP_WEIGHTS", "true").lower() == "true"
+# Weights converted to MODEL_DTYPE are saved here once, so they can be memory-mapped as well
+weights_cache_dir = os.getenv("WEIGHTS_CACHE_DIR", "weights_cache")
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def tokenizer_class(fast=fast_tokenizer):
+    """BertTokenizerFast, or the pure-Python BERT tokenizer (BertTokenizerLegacy on transformers 5,
+    where BertTokenizer itself became the fast one)."""
+    with _import_lock:
+        import transformers
+
+        if fast:
+            return transformers.BertTokenizerFast
+        return getattr(transformers, "BertTokenizerLegacy", transformers.BertTokenizer)
+
+
+def mmap_safetensors(path):
+    """name -> tensor for every tensor in a .safetensors file, as views of one private read-only
+    mapping. Nothing is read until a tensor is used, and untouched pages stay in the page cache."""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    storage = torch.UntypedStorage.from_file(path, False, os.path.getsize(path))
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        offset = 8 + header_size + info["data_offsets"][0]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        if offset % itemsize:
+            continue  # not aligned for a view; the model keeps its own copy of this one
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, offset // itemsize, info["shape"])
+    return tensors
+
+
+def map_weights(model, path):
+    """Replace the model's parameters and buffers with views of the safetensors file at `path`
+    wherever name, shape and dtype match. Returns (mapped, total)."""
+    tensors = mmap_safetensors(path)
+    named = list(model.named_parameters()) + list(model.named_buffers())
+    mapped = 0
+    with torch.no_grad():
+        for name, tensor in named:
+            source = tensors.get(name)
+            if source is not None and source.shape == tensor.shape and source.dtype == tensor.dtype:
+                tensor.data = source
+                mapped += 1
+    return mapped, len(named)
+
+
+def _safetensors_file(model_path):
+    """Local path of the model's single-file safetensors weights, or None (sharded or .bin only)."""
+    if os.path.isdir(model_path):
+        path = os.path.join(model_path, "model.safetensors")
+        return path if os.path.exists(path) else None
+    from huggingface_hub import hf_hub_download
+
+    try:
+        return hf_hub_download(model_path, "model.safetensors", token=os.getenv("HF_TOKEN"))
+    except Exception:
+        return None
+
+
+def _dtype_kwargs(dtype):
+    import transformers
+
+    # transformers 5 renamed torch_dtype to dtype
+    return {"dtype" if int(transformers.__version__.split(".")[0]) >= 5 else "torch_dtype": dtype}
+
+
+def weights_revision(model_path, commit_hash=None):
+    """Identifies the weights at `model_path`: the Hub commit, or for a local directory the
+    names, sizes and mtimes of its files. None if neither is known."""
+    if commit_hash:
+        return commit_hash
+    if os.path.isdir(model_path):
+        files = sorted((e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in os.scandir(model_path) if e.is_file())
+        return hashlib.sha256(repr(files).encode("utf-8")).hexdigest()[:16]
+    return None
+
+
+def model_revision(model, model_path):
+    """Identifies the weights behind a prediction: weights_revision plus MODEL_DTYPE and INFERENCE_BACKEND."""
+    revision = weights_revision(model_path, getattr(model.config, "_commit_hash", None))
+    return f"{model_path}@{revision}:{model_dtype}:{os.getenv('INFERENCE_BACKEND', 'torch').lower()}"
+
+
+def _converted_weights(model_cls, model_path, dtype):
+    """Directory holding the model saved in `dtype`; converts and saves it on first use."""
+    # The revision is part of the name, so changed weights are converted again instead of
+    # reusing a stale copy
+    config = model_cls.config_class.from_pretrained(model_path, token=os.getenv("HF_TOKEN"))
+    revision = weights_revision(model_path, getattr(config, "_commit_hash", None))
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{model_path}@{revision}").strip("_")
+    target = os.path.join(weights_cache_dir, f"{slug}.{str(dtype).removeprefix('torch.')}")
+    if not os.path.exists(os.path.join(target, "model.safetensors")):
+        print(f"converting {model_path} to {dtype} in {target}")
+        model = model_cls.from_pretrained(model_path, token=os.getenv("HF_TOKEN"), **_dtype_kwargs(dtype))
+        # Save next to the target and rename, so a concurrent loader never sees half a file
+        partial = f"{target}.{os.getpid()}.partial"
+        model.save_pretrained(partial)
+        try:
+            os.rename(partial, target)
+        except OSError:
+            import shutil
+
+            shutil.rmtree(partial, ignore_errors=True)  # another process converted it first
+    return target
+
+
+class ModelHandle:
+    """A BERT classifier that is loaded on first use or in the background by `load()`.
+
+    Accessing `tokenizer`, `model`, `backend` or `batcher` blocks until the model
+    has finished loading, so callers can use the handle as if it was loaded eagerly.
+    """
+
+    def __init__(self, name, model_path, tokenizer_path=None, device=None, batch_max_size=16, batch_window_ms=5.0):
+        self.name = name
+        self.model_path = model_path
+        self.tokenizer_path = tokenizer_path or model_path
+        self.device = device or torch.device("cpu")
+        self.batch_max_size = batch_max_size
+        self.batch_window_ms = batch_window_ms
+        self.load_seconds = None
+        self.revision = None  # weights_revision, once loaded
+        self._future = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Start loading in the background (if not already started) and return the Future."""
+        with self._lock:
+            if self._future is None:
+                self._future = _executor.submit(self._load)
+            return self._future
+
+    def wait(self, timeout=None):
+        """Block until the model is loaded; re-raises the load error if it failed."""
+        self.load().result(timeout)
+        return self
+
+    async def await_ready(self):
+        """`wait()` for coroutines: awaits the load without blocking the event loop."""
+        await asyncio.wrap_future(self.load())
+        return self
+
+    def _load(self):
+        # transformers alone takes seconds to import, so keep it off the import path
+        tokenizer_cls = tokenizer_class()
+        with _import_lock:
+            from transformers import BertForSequenceClassification
+
+        start = time.perf_counter()
+        print(f"loading {self.name} model")
+        tokenizer = tokenizer_cls.from_pretrained(self.tokenizer_path, token=os.getenv("HF_TOKEN"))
+        dtype = getattr(torch, model_dtype)
+        if dtype != torch.float32 and os.getenv("INFERENCE_BACKEND", "torch").lower() != "torch":
+            raise ValueError("MODEL_DTYPE only applies to INFERENCE_BACKEND=torch")
+        weights_path = self.model_path
+        if dtype != torch.float32:
+            weights_path = _converted_weights(BertForSequenceClassification, self.model_path, dtype)
+        model = BertForSequenceClassification.from_pretrained(weights_path, token=os.getenv("HF_TOKEN"), **_dtype_kwargs(dtype))
+        model.to(self.device)
+        model.eval()  # Set model to evaluation mode
+        safetensors_path = _safetensors_file(weights_path) if mmap_weights and self.device.type == "cpu" else None
+        if safetensors_path:
+            mapped, total = map_weights(model, safetensors_path)
+            print(f"{self.name}: {mapped}/{total} weight tensors memory-mapped from {safetensors_path}")
+
+        self._tokenizer = tokenizer
+        self._model = model
+        self.revision = weights_revision(self.model_path, getattr(model.config, "_commit_hash", None))
+        self._backend = load_backend(model, tokenizer, self.model_path, revision=self.revision)
+        cache = prediction_cache.for_model(self.name, model_revision(model, self.model_path), getattr(tokenizer, "do_lower_case", False))
+        self._batcher = InferenceBatcher(self._backend, tokenizer, max_batch_size=self.batch_max_size, max_wait_ms=self.batch_window_ms, name=self.name, cache=cache)
+        self.load_seconds = time.perf_counter() - start
+        print(f"{self.name} model loaded in {self.load_seconds:.1f}s")
+
+    @property
+    def tokenizer(self):
+        return self.wait()._tokenizer
+
+    @property
+    def model(self):
+        return self.wait()._model
+
+    @property
+    def backend(self):
+        return self.wait()._backend
+
+    @property
+    def batcher(self):
+        return self.wait()._batcher
+
+    @property
+    def ready(self):
+        future = self._future
+        return future is not None and future.done() and future.exception() is None
+
+    def status(self):
+        future = self._future
+        if future is None:
+            state = "not_loaded"
+        elif not future.done():
+            state = "loading"
+        elif future.exception() is not None:
+            return {"state": "failed", "error": str(future.exception())}
+        else:
+            state = "ready"
+            cache = getattr(self._batcher, "cache", None)
+            if cache is not None:
+                return {"state": state, "load_seconds": self.load_seconds, "cache": cache.stats()}
+        return {"state": state, "load_seconds": self.load_seconds}
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import threading
+import zlib
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+# Payloads larger than this are zlib-compressed before they are stored
+compress_min_bytes = 512
+
+
+class MongoSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer that stores checkpoints in MongoDB instead of process memory.
+
+    Each checkpoint is one document in `checkpoints`, indexed by `thread_id`, holding the
+    msgpack-serialized checkpoint (compressed when large). Pending writes for a step go to
+    `checkpoint_writes` in a single bulk write. Only the newest `keep_checkpoints`
+    checkpoints per thread are kept; older ones are pruned once per conversation turn.
+    """
+
+    def __init__(self, checkpoints, writes, keep_checkpoints=None, serde=None):
+        super().__init__(serde=serde)
+        self.checkpoints = checkpoints
+        self.writes = writes
+        self.keep_checkpoints = max(1, int(keep_checkpoints or os.getenv("CHECKPOINT_HISTORY", 10)))
+        self._setup_done = False
+        self._setup_lock = threading.Lock()
+
+    def setup(self):
+        """Create the indexes. Runs once, on first use, so importing never touches Mongo."""
+        if self._setup_done:
+            return
+        with self._setup_lock:
+            if self._setup_done:
+                return
+            self.checkpoints.create_index(
+                [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)],
+                unique=True,
+            )
+            self.writes.create_index(
+                [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", ASCENDING),
+                 ("task_id", ASCENDING), ("idx", ASCENDING)],
+                unique=True,
+            )
+            self._setup_done = True
+
+    def _dumps(self, obj):
+        kind, data = self.serde.dumps_typed(obj)
+        if len(data) >= compress_min_bytes:
+            return kind, zlib.compress(data, 1), True
+        return kind, data, False
+
+    def _loads(self, kind, data, compressed):
+        if compressed:
+            data = zlib.decompress(data)
+        return self.serde.loads_typed((kind, data))
+
+    def _to_tuple(self, doc):
+        thread_id, checkpoint_ns = doc["thread_id"], doc["checkpoint_ns"]
+        writes = sorted(
+            self.writes.find({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": doc["checkpoint_id"]}),
+            key=lambda w: (w.get("task_path", ""), w["task_id"], w["idx"]),
+        )
+        parent_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": doc["checkpoint_id"]}},
+            checkpoint=self._loads(doc["type"], doc["checkpoint"], doc.get("compressed", False)),
+            metadata=self._loads(doc["metadata_type"], doc["metadata"], False),
+            pending_writes=[(w["task_id"], w["channel"], self._loads(w["type"], w["value"], w.get("compressed", False))) for w in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config):
+        self.setup()
+        query = {
+            "thread_id": str(config["configurable"]["thread_id"]),
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+        }
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        doc = self.checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        return self._to_tuple(doc) if doc else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        self.setup()
+        query = {}
+        if config is not None:
+            query["thread_id"] = str(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                query["checkpoint_ns"] = config["configurable"]["checkpoint_ns"]
+            if checkpoint_id := get_checkpoint_id(config):
+                query["checkpoint_id"] = checkpoint_id
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query["checkpoint_id"] = {"$lt": before_id}
+
+        cursor = self.checkpoints.find(query).sort("checkpoint_id", DESCENDING)
+        count = 0
+        for doc in cursor:
+            if filter:
+                metadata = self._loads(doc["metadata_type"], doc["metadata"], False)
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            yield self._to_tuple(doc)
+            count += 1
+            if limit is not None and count >= limit:
+                break
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        kind, data, compressed = self._dumps(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        key = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}
+        self.checkpoints.replace_one(
+            key,
+            {
+                **key,
+                "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                "type": kind,
+                "checkpoint": data,
+                "compressed": compressed,
+                "metadata_type": metadata_type,
+                "metadata": metadata_data,
+            },
+            upsert=True,
+        )
+        # "input" checkpoints start a new turn, a good moment to drop old history
+        if metadata.get("source") == "input":
+            self.prune(thread_id, checkpoint_ns)
+        return {"configurable": key}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.setup()
+        key = {
+            "thread_id": str(config["configurable"]["thread_id"]),
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+            "checkpoint_id": config["configurable"]["checkpoint_id"],
+        }
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            kind, data, compressed = self._dumps(value)
+            doc = {**key, "task_id": task_id, "idx": idx, "task_path": task_path, "channel": channel,
+                   "type": kind, "value": data, "compressed": compressed}
+            filter_ = {**key, "task_id": task_id, "idx": idx}
+            # Regular writes are idempotent, special ones (errors, interrupts) overwrite
+            update = {"$setOnInsert": doc} if idx >= 0 else {"$set": doc}
+            operations.append(UpdateOne(filter_, update, upsert=True))
+        if operations:
+            self.writes.bulk_write(operations, ordered=False)
+
+    def prune(self, thread_id, checkpoint_ns=""):
+        """Delete all but the newest `keep_checkpoints` checkpoints (and their writes) of a thread."""
+        query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        oldest_kept = list(
+            self.checkpoints.find(query, {"checkpoint_id": 1}).sort("checkpoint_id", DESCENDING).skip(self.keep_checkpoints - 1).limit(1)
+        )
+        if not oldest_kept:
+            return
+        cutoff = {"$lt": oldest_kept[0]["checkpoint_id"]}
+        self.checkpoints.delete_many({**query, "checkpoint_id": cutoff})
+        self.writes.delete_many({**query, "checkpoint_id": cutoff})
+
+    def delete_thread(self, thread_id):
+        self.setup()
+        self.checkpoints.delete_many({"thread_id": str(thread_id)})
+        self.writes.delete_many({"thread_id": str(thread_id)})
+
+    # Async API for assistant.ainvoke/astream. The pymongo calls are short, so they run
+    # in the default executor instead of duplicating every query for an async driver.
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        tuples = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,101 @@
+"""In-memory stand-in for MongoDB, for load tests that should not need a database server.
+
+`install()` replaces pymongo's MongoClient and AsyncMongoClient with one shared
+mongomock client (plus a thin async wrapper around it). Call it before `db` is
+imported. mongomock is a test-only dependency: pip install mongomock.
+"""
+import pymongo
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    # mongomock's own bulk_write does not understand pymongo >= 4.9 operation objects
+    for request in requests:
+        kind = type(request).__name__
+        if kind == "InsertOne":
+            self.insert_one(request._doc)
+        elif kind == "UpdateOne":
+            self.update_one(request._filter, request._doc, upsert=request._upsert)
+        elif kind == "UpdateMany":
+            self.update_many(request._filter, request._doc, upsert=request._upsert)
+        elif kind == "ReplaceOne":
+            self.replace_one(request._filter, request._doc, upsert=request._upsert)
+        elif kind == "DeleteOne":
+            self.delete_one(request._filter)
+        elif kind == "DeleteMany":
+            self.delete_many(request._filter)
+        else:
+            raise NotImplementedError(kind)
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, n):
+        self._cursor = self._cursor.skip(n)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)[:length]
+
+    def __aiter__(self):
+        self._iterator = iter(self._cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class _AsyncDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._database[name])
+
+
+class _AsyncClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return _AsyncDatabase(self._client[name])
+
+
+def install():
+    """Point every MongoClient/AsyncMongoClient in this process at one in-memory database."""
+    import mongomock
+    from mongomock.collection import Collection
+
+    Collection.bulk_write = _bulk_write
+    client = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *args, **kwargs: client
+    pymongo.AsyncMongoClient = lambda *args, **kwargs: _AsyncClient(client)
+    return client
@@ -0,0 +1,114 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+import metrics
+
+# Same setting name as Flask-Bcrypt; 12 is its default too, so existing hashes keep verifying
+log_rounds = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+# bcrypt runs in its own processes so a login burst can only take these cores away from chat
+offload = os.getenv("PASSWORD_OFFLOAD", "true").lower() == "true"
+workers = int(os.getenv("PASSWORD_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hash/check requests waiting or running at once; beyond this signup/login answer 503
+queue_size = int(os.getenv("PASSWORD_QUEUE_SIZE", 64))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(queue_size)
+
+
+class PasswordQueueFull(Exception):
+    """Too many password operations are already queued."""
+
+
+def _lower_priority():
+    # Chat requests should win the CPU over password work when both compete
+    os.nice(5)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def start_pool():
+    """Start the worker processes. Call this early, before model-loading threads exist,
+    because the workers are forked from the current process."""
+    global _pool
+    if not offload:
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"), initializer=_lower_priority)
+            # ProcessPoolExecutor forks lazily; force every worker to exist now
+            for future in [_pool.submit(os.getpid) for _ in range(workers)]:
+                future.result()
+
+
+def _forget_pool():
+    # A forked child (e.g. a gunicorn worker under preload_app) inherits the pool object but
+    # not its management threads; it has to start a pool of its own
+    global _pool
+    _pool = None
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def _submit(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise PasswordQueueFull()
+    metrics.password_in_flight.inc()
+    try:
+        start_pool()
+        future = _pool.submit(fn, *args)
+    except BaseException:
+        _release()
+        raise
+    future.add_done_callback(lambda _: _release())
+    return future
+
+
+def _release():
+    metrics.password_in_flight.dec()
+    _pending.release()
+
+
+def _run(fn, *args):
+    # PASSWORD_OFFLOAD=false is the old behaviour: hash in the request's own thread
+    if not offload:
+        return fn(*args)
+    return _submit(fn, *args).result()
+
+
+async def _arun(fn, *args):
+    if not offload:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.wrap_future(_submit(fn, *args))
+
+
+def hash_password(password):
+    return _run(_hash, password, log_rounds)
+
+
+def check_password(hashed, password):
+    return _run(_check, hashed, password)
+
+
+async def ahash_password(password):
+    return await _arun(_hash, password, log_rounds)
+
+
+async def acheck_password(hashed, password):
+    return await _arun(_check, hashed, password)
+
+
+def status():
+    return {"offload": offload, "workers": workers if offload else 0, "queue_size": queue_size, "log_rounds": log_rounds}
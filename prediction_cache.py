@@ -0,0 +1,128 @@
+"""LRU cache of BERT logits, in front of InferenceBatcher.
+
+Short repeats ("ok", "thanks", "I don't know") make up a good share of chat turns;
+a cache hit answers them without a forward pass. Keys hash the model revision
+together with the normalized text. Normalizing only collapses whitespace (and
+lowercases for uncased tokenizers), which never changes the tokens BERT sees.
+So a hit returns exactly the logits a forward pass would.
+"""
+import atexit
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+import metrics
+
+# Logits kept per model; 0 turns the cache off
+cache_size = int(os.getenv("PREDICTION_CACHE_SIZE", 10000))
+# Directory the caches are saved to at exit and reloaded from at startup; unset keeps them in memory only
+cache_dir = os.getenv("PREDICTION_CACHE_DIR")
+
+
+def normalize(text, lowercase=False):
+    text = " ".join(text.split())
+    return text.lower() if lowercase else text
+
+
+class PredictionCache:
+    """A bounded, thread-safe LRU mapping texts to the 1-D logits tensor predicted for them.
+
+    Once `max_entries` is reached, the least recently used entry is evicted. With a
+    `path`, the entries are loaded from it on creation and saved to it at interpreter exit.
+    """
+
+    def __init__(self, name, revision, max_entries=cache_size, lowercase=False, path=None):
+        self.name = name
+        self.revision = revision
+        self.max_entries = max_entries
+        self.lowercase = lowercase
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # Only a process that added predictions saves them; a gunicorn master that merely
+        # loaded the file must not overwrite what its workers saved
+        self._dirty = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.revision}\0{normalize(text, self.lowercase)}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """The cached logits for `key`, or None."""
+        with self._lock:
+            logits = self._entries.get(key)
+            if logits is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.prediction_cache_lookups.inc(model=self.name, result="miss" if logits is None else "hit")
+        return logits
+
+    def put(self, key, logits):
+        # Copy the row so the cache doesn't keep the whole batch's logits alive
+        logits = logits.detach().clone()
+        evicted = 0
+        with self._lock:
+            self._entries[key] = logits
+            self._entries.move_to_end(key)
+            self._dirty = True
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            size = len(self._entries)
+        if evicted:
+            metrics.prediction_cache_evictions.inc(evicted, model=self.name)
+        metrics.prediction_cache_entries.set(size, model=self.name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else None}
+
+    def save(self):
+        with self._lock:
+            keys = list(self._entries)
+            logits = list(self._entries.values())
+        if not keys or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write next to the file and rename, so other workers never read half a file
+        partial = f"{self.path}.{os.getpid()}.partial"
+        torch.save({"revision": self.revision, "keys": keys, "logits": logits}, partial)
+        os.replace(partial, self.path)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            saved = torch.load(self.path, weights_only=True)
+        except Exception as exc:
+            print(f"{self.name}: ignoring unreadable prediction cache {self.path}: {exc}")
+            return
+        # Predictions from other weights would be wrong; their keys could never match anyway
+        if saved.get("revision") != self.revision:
+            print(f"{self.name}: prediction cache {self.path} is for another model revision, starting empty")
+            return
+        # Saved least recently used first; keep the most recent entries if the cache shrank
+        for key, logits in list(zip(saved["keys"], saved["logits"]))[-self.max_entries:]:
+            self._entries[key] = logits
+        metrics.prediction_cache_entries.set(len(self._entries), model=self.name)
+        print(f"{self.name}: loaded {len(self._entries)} cached predictions from {self.path}")
+
+
+def for_model(name, revision, lowercase=False):
+    """The PredictionCache configured by PREDICTION_CACHE_SIZE / PREDICTION_CACHE_DIR, or None when off."""
+    if cache_size <= 0:
+        return None
+    path = os.path.join(cache_dir, f"{name}.pt") if cache_dir else None
+    return PredictionCache(name, revision, cache_size, lowercase, path)
@@ -0,0 +1,38 @@
+"""Reference messages for the distortion model and journal feedback for the sentiment model,
+shared by the accuracy and performance scripts."""
+
+distortion_reference = [
+    "I failed one test so I'm a complete failure.",
+    "Everyone at the party must have thought I was boring.",
+    "If I don't get promoted this year my career is over.",
+    "I should always be productive, resting is lazy.",
+    "It's my fault my parents got divorced.",
+    "My boss never appreciates anything I do.",
+    "I feel anxious, so something bad is definitely going to happen.",
+    "If my partner really loved me they would change for me.",
+    "I worked hard so I deserve to be rewarded.",
+    "It's not fair that others have it easier than me.",
+    "I'm right about this and I won't hear otherwise.",
+    "The presentation went well except for one slide, so it was a disaster.",
+    "Either I do it perfectly or I'm a failure.",
+    "I can't control anything that happens in my life.",
+    "I had a nice lunch with a friend today.",
+    "Can you tell me more about CBT?",
+    "ok",
+    "thanks",
+    "I went for a run this morning and it felt good.",
+    "I'm a loser, I always mess things up.",
+]
+
+sentiment_reference = [
+    "I completed the task and felt confident and proud of myself.",
+    "The exercise was okay, it helped a little.",
+    "I couldn't do the task, nothing worked and I was stuck the whole time.",
+    "It was fine, not bad, I wrote down three thoughts.",
+    "I felt anxious and unsure the whole time I was journaling.",
+    "Excellent task, I feel much happier and I accomplished all the steps.",
+    "I did half of it. Some parts were useful, some weren't.",
+    "I was too nervous to try the behavioral experiment.",
+    "Great exercise, I noticed my distortions and challenged them successfully.",
+    "Average, I'm not sure it changed anything.",
+]
@@ -0,0 +1,157 @@
+import asyncio
+import collections
+import math
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Chat turns run on at most TURN_WORKERS workers. At most TURN_QUEUE_SIZE turns may wait
+# in total and USER_QUEUE_SIZE per user; past that, new messages are refused (backpressure)
+# instead of piling up behind a slow LLM.
+turn_workers = int(os.getenv("TURN_WORKERS", 32))
+turn_queue_size = int(os.getenv("TURN_QUEUE_SIZE", 256))
+user_queue_size = int(os.getenv("USER_QUEUE_SIZE", 5))
+# Waiting coroutines cost next to nothing, so the asyncio server can run many more turns
+async_turn_workers = int(os.getenv("ASYNC_TURN_WORKERS", 512))
+# Journal feedback jobs (sentiment rating + LLM summary) run on their own, smaller pool
+feedback_workers = int(os.getenv("FEEDBACK_WORKERS", 8))
+
+
+class _QueueStats:
+    """Queue depth and wait-time bookkeeping shared by both schedulers."""
+
+    def __init__(self, max_workers, max_queued, max_queued_per_user):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._waits = collections.deque(maxlen=1000)  # seconds, most recent turns
+        # user_id -> deque of (job, enqueued_at); a user is present while any of its turns is queued or running
+        self._users = {}
+
+    def _admit(self, user_id, job):
+        """Queue `job` for `user_id`; returns None if refused, True if the user needs a new runner."""
+        pending = self._users.get(user_id)
+        if self.queued >= self.max_queued or (pending is not None and len(pending) >= self.max_queued_per_user):
+            self.rejected += 1
+            return None
+        self.submitted += 1
+        self.queued += 1
+        if pending is None:
+            self._users[user_id] = collections.deque([(job, time.perf_counter())])
+            return True
+        pending.append((job, time.perf_counter()))
+        return False
+
+    def _next(self, user_id):
+        job, enqueued = self._users[user_id].popleft()
+        self.queued -= 1
+        self.running += 1
+        self._waits.append(time.perf_counter() - enqueued)
+        return job
+
+    def _done(self, user_id):
+        """Returns True if the user has more turns waiting."""
+        self.running -= 1
+        self.completed += 1
+        if self._users[user_id]:
+            return True
+        del self._users[user_id]
+        return False
+
+    def _stats(self):
+        waits = sorted(self._waits)
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "active_users": len(self._users),
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "wait_ms_p50": statistics.median(waits) * 1000 if waits else 0.0,
+            "wait_ms_p95": waits[math.ceil(len(waits) * 0.95) - 1] * 1000 if waits else 0.0,
+            "wait_ms_max": waits[-1] * 1000 if waits else 0.0,
+        }
+
+
+class TurnScheduler(_QueueStats):
+    """Runs each user's chat turns one at a time, in arrival order, and different users in parallel.
+
+    Two messages from the same user never run `assistant` concurrently on the same
+    thread_id, so their checkpoints and conversation appends cannot interleave.
+    """
+
+    def __init__(self, max_workers=turn_workers, max_queued=turn_queue_size, max_queued_per_user=user_queue_size):
+        super().__init__(max_workers, max_queued, max_queued_per_user)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn")
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, fn, *args):
+        """Queue `fn(*args)` behind the user's earlier turns. Returns False if the queue is full."""
+        with self._lock:
+            start = self._admit(user_id, (fn, args))
+        if start is None:
+            return False
+        if start:
+            self._executor.submit(self._run_next, user_id)
+        return True
+
+    def _run_next(self, user_id):
+        with self._lock:
+            fn, args = self._next(user_id)
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"turn for {user_id} failed: {e}")
+        finally:
+            with self._lock:
+                more = self._done(user_id)
+            # Go to the back of the executor's queue so one busy user can't starve the others
+            if more:
+                self._executor.submit(self._run_next, user_id)
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
+
+
+class AsyncTurnScheduler(_QueueStats):
+    """TurnScheduler for coroutines: per-user order, at most `max_workers` turns running at once."""
+
+    def __init__(self, max_workers=async_turn_workers, max_queued=turn_queue_size, max_queued_per_user=user_queue_size):
+        super().__init__(max_workers, max_queued, max_queued_per_user)
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks = set()
+
+    def submit(self, user_id, coro_fn, *args):
+        start = self._admit(user_id, (coro_fn, args))
+        if start is None:
+            return False
+        if start:
+            task = asyncio.create_task(self._run_user(user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run_user(self, user_id):
+        more = True
+        while more:
+            async with self._slots:
+                coro_fn, args = self._next(user_id)
+                try:
+                    await coro_fn(*args)
+                except Exception as e:
+                    print(f"turn for {user_id} failed: {e}")
+                finally:
+                    more = self._done(user_id)
+
+    def stats(self):
+        return self._stats()
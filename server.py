@@ -1,40 +1,57 @@
 import torch
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
 from dotenv import load_dotenv, find_dotenv
-from transformers import BertTokenizer, BertForSequenceClassification
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_bcrypt import Bcrypt
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, decode_token
 import os
 import groq
 from langgraph.graph import MessagesState
-from flask import Flask, request, jsonify, render_template
-from flask_socketio import SocketIO, emit
-from pymongo import MongoClient
+from flask import Flask, Response, request, jsonify, render_template
+from flask_socketio import SocketIO, emit, join_room
 import datetime
+import time
 from flask_cors import CORS
-from model import assistant, journal_report
-from utils import State
+from model import assistant, task_assignment_agent
+from utils import State, warm_up, model_status
+from db import conversations_collection, tasks_collection, journal_reports_collection, users_collection
+from conversation_store import append_messages, get_page, has_messages, page_args
+from indexes import ensure_indexes
+from llm_clients import llm_status
+from scheduler import TurnScheduler, feedback_workers
+import feedback_jobs
+import passwords
+import metrics
 from langchain_core.messages import HumanMessage
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 load_dotenv(find_dotenv())
 
-mongo_uri = os.getenv("MONGO_URI")
-mongo_client = MongoClient(mongo_uri)
-db = mongo_client["chat_db"]
-conversations_collection = db["conversations"]
-tasks_collection = db["tasks"]
-journal_reports_collection = db["journal_reports"]
-users_collection = db["users"]
-
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# With more than one server process, a message queue (e.g. redis://localhost:6379/0) carries
+# every emit to the process holding the target room; unset, rooms are local to this process
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"))
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET") 
 jwt = JWTManager(app)
-bcrypt = Bcrypt(app)
+
+# Each user's messages are processed in order, different users in parallel
+turns = TurnScheduler()
+metrics.Gauge("chat_turns_queued", "Chat turns waiting for a worker.", function=lambda: turns.queued)
+metrics.Gauge("chat_turns_running", "Chat turns being processed.", function=lambda: turns.running)
+# Feedback jobs run off the request thread, each user's in order
+feedback_queue = TurnScheduler(max_workers=feedback_workers)
+metrics.Gauge("feedback_jobs_queued", "Feedback jobs waiting for a worker.", function=lambda: feedback_queue.queued)
+metrics.Gauge("feedback_jobs_running", "Feedback jobs being processed.", function=lambda: feedback_queue.running)
+
+# Fork the password workers before any model-loading threads start
+passwords.start_pool()
+
+# Load the BERT models in the background so the server binds its port right away
+warm_up()
+# Create any missing indexes for the hot queries (no-op when they already exist)
+ensure_indexes()
 
 
 @app.route("/api/signup", methods=["POST"])
@@ -52,7 +69,10 @@ def signup():
     if users_collection.find_one({"email": email}):
         return jsonify({"error": "User already exists"}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode("utf-8")
+    try:
+        hashed_password = passwords.hash_password(password)
+    except passwords.PasswordQueueFull:
+        return jsonify({"error": "Server busy, please try again"}), 503
     new_user = {
         "fullName": full_name,
         "email": email,
@@ -62,7 +82,11 @@ def signup():
         "gender": gender,
         "created_at": datetime.datetime.utcnow()
     }
-    users_collection.insert_one(new_user)
+    try:
+        users_collection.insert_one(new_user)
+    except DuplicateKeyError:
+        # A concurrent signup with the same email won the unique index
+        return jsonify({"error": "User already exists"}), 400
     
     return jsonify({"message": "User created successfully"}), 201
 
@@ -76,7 +100,11 @@ def login():
         return jsonify({"error": "Missing email or password"}), 400
     
     user = users_collection.find_one({"email": email})
-    if user and bcrypt.check_password_hash(user["password"], password):
+    try:
+        valid = user is not None and passwords.check_password(user["password"], password)
+    except passwords.PasswordQueueFull:
+        return jsonify({"error": "Server busy, please try again"}), 503
+    if valid:
         access_token = create_access_token(identity=email, expires_delta=datetime.timedelta(days=1))
         return jsonify({
             "message": "Login successful",
@@ -114,6 +142,20 @@ def protected():
 def index():
     return "Backend is running."
 
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    models = model_status()
+    is_ready = all(m["state"] == "ready" for m in models.values())
+    return jsonify({"ready": is_ready, "models": models}), 200 if is_ready else 503
+
+@app.route("/api/queue", methods=["GET"])
+def queue_status():
+    return jsonify({"turns": turns.stats(), "feedback": feedback_queue.stats(), "llm": llm_status(), "passwords": passwords.status()}), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # @app.route("/api/conversations", methods=["GET"])
 # @jwt_required()
 # def get_conversations():
@@ -134,28 +176,33 @@ def get_conversations():
     user = users_collection.find_one({"email": current_user})
     user_id = str(user["_id"])
 
-    # Try to find the conversation document
-    conversation_doc = conversations_collection.find_one({"user_id": user_id})
-
-    # If no conversation exists, create a new one
-    if not conversation_doc:
-        new_conversation = {
-            "user_id": user_id,
-            "conversation": [
-                {
-                    "sender": "ai",
-                    "content": "Hello! How can I help you today?",
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "type": "text",
-                }
-            ],
-        }
-        conversations_collection.insert_one(new_conversation)
-        conversation = new_conversation["conversation"]
-    else:
-        conversation = conversation_doc["conversation"]
+    # Newest page first; pass the returned "before" cursor to load older messages
+    try:
+        before, limit = page_args(request.args.get("before"), request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"error": "Invalid before or limit"}), 400
+
+    # The per-user document now only holds chat state; messages live in buckets
+    conversations_collection.update_one(
+        {"user_id": user_id},
+        {"$setOnInsert": {"user_id": user_id, "distortion": []}},
+        upsert=True
+    )
+
+    # Start a new conversation with a greeting
+    if not has_messages(user_id):
+        append_messages(user_id, [
+            {
+                "sender": "ai",
+                "content": "Hello! How can I help you today?",
+                "timestamp": datetime.datetime.now().isoformat(),
+                "type": "text",
+            }
+        ])
+
+    conversation, before = get_page(user_id, before, limit)
 
-    return jsonify({"conversation": conversation}), 200
+    return jsonify({"conversation": conversation, "before": before, "has_more": before is not None}), 200
 
 
 @app.route("/api/tasks", methods=["GET"])
@@ -209,9 +256,79 @@ def update_user():
     
     return jsonify({"message": "User updated successfully"}), 200
 
+# Socket.IO session id -> authenticated user id (also the name of the user's room)
+socket_users = {}
+
+@socketio.on("connect")
+def handle_connect(auth):
+    """Only accept sockets that present a valid JWT, and put each one in its user's room."""
+    # Only from the auth payload: a ?token= query string would end up in the access log
+    token = (auth or {}).get("token")
+    if not token:
+        return False
+    try:
+        email = decode_token(token)["sub"]
+    except Exception:
+        return False
+    user = users_collection.find_one({"email": email}, {"_id": 1})
+    if not user:
+        return False
+
+    user_id = str(user["_id"])
+    socket_users[request.sid] = user_id
+    join_room(user_id)
+
+@socketio.on("disconnect")
+def handle_disconnect(*args):
+    socket_users.pop(request.sid, None)
+
+def stream_reply(initial_data, config, user_id, on_reply):
+    """Run the graph, forwarding chat_node tokens as receive_message_chunk events.
+
+    on_reply(state) is called with the state as of chat_node's update, so the reply is
+    saved and sent without waiting for the summary that runs after it. Returns the
+    final graph state, like assistant.invoke.
+    """
+    start = time.perf_counter()
+    first_token = None
+    response = None
+    replied = False
+    for mode, chunk in assistant.stream(initial_data, config, stream_mode=["messages", "updates", "values"]):
+        if mode == "updates":
+            # A step's updates arrive just before the state they produce
+            replied = replied or "chat_node" in chunk
+            continue
+        if mode == "values":
+            response = chunk
+            if replied:
+                on_reply(chunk)
+                replied = False
+            continue
+        message, metadata = chunk
+        # Only the reply's tokens are streamed; summarizer/classifier tokens are internal
+        # and the complete AIMessage written to the state arrives with receive_message
+        if metadata.get("langgraph_node") != "chat_node" or not isinstance(message, AIMessageChunk) or not message.content:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+            metrics.first_token_seconds.observe(first_token)
+        socketio.emit("receive_message_chunk", {"content": message.content, "sender": "ai"}, to=user_id)
+
+    total = time.perf_counter() - start
+    if first_token is not None:
+        print(f"time to first token: {first_token * 1000:.0f}ms, full turn: {total * 1000:.0f}ms")
+    return response
+
 @socketio.on("send_message")
 def handle_message(json_data):
-    user_id = json_data["userId"]
+    # Trust the identity from the socket's JWT, not the userId in the payload
+    user_id = socket_users.get(request.sid)
+    if not user_id:
+        return
+    if not turns.submit(user_id, process_message, user_id, json_data):
+        socketio.emit("server_busy", {"error": "Too many messages in progress, please try again shortly"}, to=request.sid)
+
+def process_message(user_id, json_data):
     user_message = json_data["userMessage"]
     user_content = [HumanMessage(content=user_message["content"])]
     
@@ -222,7 +339,7 @@ def handle_message(json_data):
         "task": ""
     }
     
-    state_doc = conversations_collection.find_one({"user_id": user_id})
+    state_doc = conversations_collection.find_one({"user_id": user_id}) or {}
     if state_doc.get("distortion", []):
         initial_data["distortion"] = state_doc["distortion"]
         
@@ -232,15 +349,13 @@ def handle_message(json_data):
         
     
     config = {"configurable": {"thread_id": user_id}}
-    response = assistant.invoke(initial_data, config)
-    
+    # The turn (and the user's next message) still waits for the summary, which only
+    # the next prompt reads; the reply goes out as soon as chat_node is done
+    stream_reply(initial_data, config, user_id, lambda state: deliver_reply(user_id, user_message, state))
+
+def deliver_reply(user_id, user_message, response):
+    """Save the turn and send the reply from the state chat_node produced."""
     detected_distortion = response["distortion"]
-    if response["task"] != "":
-        tasks_collection.insert_one({
-            "user_id": user_id,
-            "description": response["task"],
-            "completed": False,
-        })
     
     ai_responses = [msg.content for msg in response["messages"] if isinstance(msg, AIMessage)]
     ai_response = ai_responses[-1]
@@ -260,31 +375,50 @@ def handle_message(json_data):
     if user_message["type"] == "audio":
         user_entry["uri"] = user_message.get("uri", "")
     
+    append_messages(user_id, [
+        user_entry,
+        {"sender": "ai", "content": ai_response, "timestamp": ai_timestamp, "type": "text"}
+    ])
     conversations_collection.update_one(
-    {"user_id": user_id},
-    {
-        "$push": {
-            "conversation": {
-                "$each": [
-                    user_entry,
-                    {"sender": "ai", "content": ai_response, "timestamp": ai_timestamp, "type": "text"}
-                ]
-            },
-        },
-        "$set": {
+        {"user_id": user_id},
+        {"$set": {
             "distortion": detected_distortion  # Replace the entire list with new distortions
-        }
-    },
-    upsert=True
-)
+        }},
+        upsert=True
+    )
 
     
     socketio.emit("receive_message", {
         "content": ai_response,
         "sender": "ai",
         "timestamp": ai_timestamp,
-        "task": response["task"]
-    })
+        "task": ""  # new tasks arrive separately as task_assigned
+    }, to=user_id)
+
+    # The task prompt is large, so it runs after the reply instead of delaying it
+    socketio.start_background_task(assign_task, user_id, response)
+
+def assign_task(user_id, state):
+    """Generate a CBT task from the turn's state and push it as task_assigned."""
+    try:
+        task = task_assignment_agent(state)["task"]
+    except Exception as e:
+        print(f"task generation failed for {user_id}: {e}")
+        return
+    if not task:
+        return
+
+    # Only insert if the user still has no open task (another turn's job may have added one)
+    result = tasks_collection.update_one(
+        {"user_id": user_id, "completed": False},
+        {"$setOnInsert": {"user_id": user_id, "description": task, "completed": False}},
+        upsert=True
+    )
+    if result.upserted_id is None:
+        return
+    socketio.emit("task_assigned", {
+        "task": {"_id": str(result.upserted_id), "description": task, "completed": False}
+    }, to=user_id)
     
 @app.route("/api/feedback/<taskId>", methods=["POST"])
 @jwt_required()
@@ -296,26 +430,43 @@ def submit_feedback(taskId):
     if not task_doc:
         return jsonify({"error": "Task not found"}), 404
     
-    response = journal_report(feedback, task_doc["description"])
-    summary = response["ai_feedback"]
-    rating = response["rating"]
-    print(summary)
-    print(rating)
-    
-    
-    tasks_collection.update_one(
-        {"_id": ObjectId(taskId)},
-        {"$set": {
-            "feedback": feedback,
-            "summary": summary,
-            "rating": rating,
-            "completed": True
-        }},
-    )
-    
-    return jsonify({"message": "Feedback submitted", "summary": summary, "rating": rating}), 200
+    # Rating and summarizing take seconds; answer now and push the result when it is ready
+    job, created = feedback_jobs.submit(task_doc, feedback)
+    if created and not feedback_queue.submit(task_doc["user_id"], process_feedback, task_doc, feedback, job["id"]):
+        feedback_jobs.fail(task_doc["_id"], job["id"], "server busy")
+        return jsonify({"error": "Too many feedback submissions in progress, please try again shortly"}), 503
+    if not created:
+        # This feedback was not recorded; the client can resubmit once the running job finishes
+        return jsonify({
+            "error": "Feedback for this task is already being processed",
+            "jobId": job["id"],
+            "status": job["status"],
+            "statusUrl": f"/api/feedback/jobs/{job['id']}",
+        }), 409
+
+    return jsonify({
+        "message": "Feedback received",
+        "jobId": job["id"],
+        "status": job["status"],
+        "statusUrl": f"/api/feedback/jobs/{job['id']}",
+    }), 202
+
+def process_feedback(task_doc, feedback, job_id):
+    result = feedback_jobs.run(task_doc, feedback, job_id)
+    if result is not None:
+        socketio.emit("feedback_processed", result, to=task_doc["user_id"])
+
+@app.route("/api/feedback/jobs/<jobId>", methods=["GET"])
+@jwt_required()
+def get_feedback_job(jobId):
+    current_user = get_jwt_identity()
+    user = users_collection.find_one({"email": current_user})
+    job = feedback_jobs.get(jobId, str(user["_id"]))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
 
     
     
 if __name__ == "__main__":
-    socketio.run(app, host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
+    socketio.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)), debug=True, use_reloader=os.getenv("USE_RELOADER", "true").lower() == "true", allow_unsafe_werkzeug=True)
\ No newline at end of file
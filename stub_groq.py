@@ -0,0 +1,130 @@
+"""A local stand-in for the Groq chat completions API, for benchmarks and load tests.
+
+Speaks the OpenAI-compatible `/openai/v1/chat/completions` endpoint that ChatGroq
+uses (plain and streaming responses) with a configurable delay, over keep-alive
+HTTP/1.1 so connection reuse can be observed. Point the app at it with
+GROQ_API_BASE=http://127.0.0.1:<port>.
+
+    python stub_groq.py --port 8090 --latency-ms 300
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+default_reply = "I hear you. It sounds like a lot is weighing on you right now. What feels hardest about it today?"
+
+
+class StubGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # many clients connect at once under load
+
+    def __init__(self, port=0, latency_ms=0.0, token_delay_ms=0.0, reply=default_reply, classifier_reply="chat"):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency_ms / 1000.0
+        self.token_delay = token_delay_ms / 1000.0
+        self.reply = reply
+        self.classifier_reply = classifier_reply
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def get_request(self):
+        request = super().get_request()
+        with self._lock:
+            self.connections += 1
+        return request
+
+    def handle_error(self, request, client_address):
+        # The app under test drops its keep-alive connections when it is stopped
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reply_for(self, messages):
+        prompt = str(messages[-1].get("content", "")) if messages else ""
+        # The classifier node only accepts one of these two words
+        if "Only respond with 'distortion' or 'chat'" in prompt:
+            return self.classifier_reply
+        return self.reply
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        with server._lock:
+            server.requests += 1
+        time.sleep(server.latency)
+
+        model = body.get("model", "stub")
+        text = server.reply_for(body.get("messages", []))
+        if body.get("stream"):
+            self._stream(model, text)
+            return
+
+        payload = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, model, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+            self._event({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if i == len(words) - 1 else None}],
+            })
+            time.sleep(self.server.token_delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _event(self, data):
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode())
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--token-delay-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    server = StubGroqServer(args.port, args.latency_ms, args.token_delay_ms)
+    print(f"Stub Groq API on {server.url} (set GROQ_API_BASE to this)")
+    server.serve_forever()
@@ -1,26 +1,15 @@
 import os
 from dotenv import load_dotenv, find_dotenv
-from transformers import BertTokenizer, BertForSequenceClassification
 from langgraph.graph import MessagesState
 from langgraph.checkpoint.memory import MemorySaver
-import torch
+from mongo_checkpointer import MongoSaver
+# The BERT models live in model_handles.py, which gunicorn.conf.py can import without
+# the Mongo clients below; re-exported here for existing imports
+from model_handles import bert, sentiment, device, warm_up, model_status  # noqa: F401
 
 # Load environment variables
 load_dotenv(find_dotenv())
 
-# Load fine-tuned BERT model for cognitive distortion detection
-bert_tokenizer = BertTokenizer.from_pretrained(os.getenv("BERT_TOKENIZER"), token=os.getenv("HF_TOKEN"))
-bert_model = BertForSequenceClassification.from_pretrained(os.getenv("BERT_MODEL"), token=os.getenv("HF_TOKEN"))
-
-sentinment_tokenizer = BertTokenizer.from_pretrained(os.getenv("SENTIMENT_MODEL"), token=os.getenv("HF_TOKEN"))
-sentiment_model = BertForSequenceClassification.from_pretrained(os.getenv("SENTIMENT_MODEL"), token=os.getenv("HF_TOKEN"))
-
-# Move model to the appropriate device (CPU/GPU)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-sentiment_model.to(device)
-sentiment_model.eval()  # Set model to evaluation mode
-
-
 # Define label mapping for cognitive distortions
 label_map = {
     0: 'Control Fallacies',
@@ -57,5 +46,12 @@ class State(MessagesState):
     answer: str
     summary: str
     restruct: str
-
-memory = MemorySaver()
\ No newline at end of file
+    needs_distortion_check: bool
+    detected_distortion: str
+
+# Conversation checkpoints live in Mongo by default; CHECKPOINTER=memory keeps them in process RAM
+if os.getenv("CHECKPOINTER", "mongo") == "mongo":
+    from db import checkpoints_collection, checkpoint_writes_collection
+    memory = MongoSaver(checkpoints_collection, checkpoint_writes_collection)
+else:
+    memory = MemorySaver()